@@ -0,0 +1,176 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+from django.core.exceptions import ImproperlyConfigured
+
+from foodgram.metrics import define, inc
+
+from rest_framework.authentication import TokenAuthentication
+
+define(
+    'foodgram_token_auth_cache_total', 'counter',
+    'Обращения к кэшу токенов по результату'
+)
+
+
+class TokenCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL
+)
+
+
+def get_shared_cache():
+    if not settings.TOKEN_AUTH_SHARED_CACHE:
+        return None
+    shared_cache = caches[settings.TOKEN_AUTH_SHARED_CACHE]
+    # Отзыв токена должны увидеть все воркеры, кэш внутри процесса
+    # для этого не годится.
+    if isinstance(shared_cache, (DummyCache, LocMemCache)):
+        raise ImproperlyConfigured(
+            f'TOKEN_AUTH_SHARED_CACHE: кэш '
+            f'{settings.TOKEN_AUTH_SHARED_CACHE} не общий для процессов'
+        )
+    return shared_cache
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    try:
+        get_shared_cache()
+    except ImproperlyConfigured as error:
+        return [Error(str(error), id='api.E001')]
+    return []
+
+
+def get_shared_key(key):
+    return 'token-auth:' + sha256(key.encode()).hexdigest()
+
+
+def get_generation_key(key):
+    return 'token-auth-generation:' + sha256(key.encode()).hexdigest()
+
+
+def get_generation(shared_cache, key):
+    return shared_cache.get(get_generation_key(key), 0)
+
+
+def get_cached_user(key):
+    # Локальный кэш одного процесса не узнает о выходе или блокировке
+    # пользователя в другом воркере, поэтому без общего кэша он выключен,
+    # а с общим попадание сверяется с поколением токена не реже, чем раз
+    # в TOKEN_AUTH_REVALIDATE_INTERVAL секунд.
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return None
+
+    entry = token_cache.get(key)
+    if entry is not None and (
+        time.monotonic() - entry[2] < settings.TOKEN_AUTH_REVALIDATE_INTERVAL
+    ):
+        inc('foodgram_token_auth_cache_total', result='local_hit')
+        return entry[0]
+
+    generation = get_generation(shared_cache, key)
+    if entry is not None and entry[1] == generation:
+        inc('foodgram_token_auth_cache_total', result='local_hit')
+        token_cache.set(key, (entry[0], generation, time.monotonic()))
+        return entry[0]
+
+    entry = shared_cache.get(get_shared_key(key))
+    if entry is not None and entry[1] == generation:
+        inc('foodgram_token_auth_cache_total', result='shared_hit')
+        token_cache.set(key, (entry[0], generation, time.monotonic()))
+        return entry[0]
+
+    inc('foodgram_token_auth_cache_total', result='miss')
+    return None
+
+
+def remember_user(key, user, generation):
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return
+    token_cache.set(key, (user, generation, time.monotonic()))
+    shared_cache.set(
+        get_shared_key(key), (user, generation),
+        settings.TOKEN_AUTH_SHARED_CACHE_TTL
+    )
+
+
+def forget_tokens(keys):
+    for key in keys:
+        token_cache.delete(key)
+    shared_cache = get_shared_cache()
+    if shared_cache is None or not keys:
+        return
+    # Новое поколение - случайное значение, а не счётчик: incr падает,
+    # если ключ вытеснили между чтением и записью.
+    shared_cache.set_many({
+        get_generation_key(key): uuid.uuid4().hex for key in keys
+    }, timeout=None)
+    shared_cache.delete_many([get_shared_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = get_cached_user(key)
+        if user is not None:
+            user = copy.deepcopy(user)
+            return user, self.get_model()(key=key, user=user)
+
+        shared_cache = get_shared_cache()
+        # Поколение читаем до запроса в базу: если токен отзовут, пока
+        # идёт запрос, запись с прежним поколением не пройдёт проверку.
+        generation = (
+            None if shared_cache is None
+            else get_generation(shared_cache, key)
+        )
+        user, token = super().authenticate_credentials(key)
+        if generation is not None:
+            remember_user(key, copy.deepcopy(user), generation)
+        return user, token
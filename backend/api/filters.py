@@ -3,9 +3,16 @@ from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
+RECIPE_ORDERING = {
+    'newest': ('-created', '-id'),
+    'cooking_time': ('cooking_time', 'id'),
+    'popularity': ('-favorites_count', '-id'),
+}
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='startswith')
@@ -17,14 +24,20 @@ class IngredientFilter(FilterSet):
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    cooking_time = filters.RangeFilter()
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERING],
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
@@ -32,9 +45,17 @@ class RecipeFilter(FilterSet):
             'tags',
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'cooking_time',
+            'ordering',
         )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.with_any_tag(value)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -46,3 +67,9 @@ class RecipeFilter(FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERING[value])
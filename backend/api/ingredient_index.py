@@ -0,0 +1,110 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from recipes.models import DataVersion, INGREDIENT_CATALOG, Ingredient
+
+PREFIX_END = '\U0010ffff'
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    def __init__(self, ttl, check_interval):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = []
+        self._built_at = None
+        self._version = None
+        self._checked_at = None
+        self._building = False
+
+    def is_current(self):
+        # Каталог мог измениться в другом процессе: сверяем общую версию,
+        # но не чаще раза в check_interval.
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return True
+        self._checked_at = now
+        version = DataVersion.objects.get_version(INGREDIENT_CATALOG)
+        if version != self._version:
+            self._built_at = None
+            return False
+        return True
+
+    @property
+    def is_ready(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < self.ttl
+            and self.is_current()
+        )
+
+    def build(self):
+        version = DataVersion.objects.get_version(INGREDIENT_CATALOG)
+        rows = Ingredient.objects.annotate(
+            usage=Count('recipe')
+        ).values_list('id', 'name', 'measurement_unit', 'usage')
+
+        entries = sorted(
+            (normalize(name), -usage, name, pk, measurement_unit)
+            for pk, name, measurement_unit, usage in rows
+        )
+        with self._lock:
+            self._keys = [entry[0] for entry in entries]
+            self._entries = entries
+            self._version = version
+            self._built_at = self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        self._built_at = None
+        DataVersion.objects.bump(INGREDIENT_CATALOG)
+
+    def refresh(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        finally:
+            self._building = False
+            connection.close()
+
+    def search(self, prefix):
+        if not self.is_ready:
+            self.refresh()
+            return None
+
+        prefix = normalize(prefix)
+        with self._lock:
+            keys, entries = self._keys, self._entries
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_END, start)
+
+        return [
+            {
+                'id': pk,
+                'name': name,
+                'measurement_unit': measurement_unit,
+            }
+            for _, _, name, pk, measurement_unit in sorted(
+                entries[start:end], key=lambda entry: entry[1:3]
+            )
+        ]
+
+
+ingredient_index = IngredientIndex(
+    settings.INGREDIENT_INDEX_TTL, settings.INGREDIENT_INDEX_CHECK_INTERVAL
+)
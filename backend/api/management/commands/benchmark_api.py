@@ -0,0 +1,265 @@
+import json
+import time
+from contextlib import ExitStack
+from statistics import median
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from api.metrics import RequestStats
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+
+from recipes.models import Follow, Ingredient, Recipe, ShoppingCart, Tag, User
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .benchmark_ingredients import percentile
+
+
+class TestClientRunner:
+    def __init__(self, token):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, method, path, params):
+        stats = RequestStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = getattr(self.client, method)(path, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return (
+            time.perf_counter() - started, stats.queries, response.status_code
+        )
+
+
+class HttpRunner:
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}'}
+
+    def request(self, method, path, params):
+        url = self.base_url + path
+        if params and method == 'get':
+            url = f'{url}?{urlencode(params, doseq=True)}'
+        request = Request(url, method=method.upper(), headers=self.headers)
+        started = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            error.read()
+            status = error.code
+        return time.perf_counter() - started, None, status
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints and compare with stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', default=50, type=int)
+        parser.add_argument('--warmup', default=5, type=int)
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого идут запросы'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера вместо тестового клиента'
+        )
+        parser.add_argument('--only', nargs='*', default=())
+        parser.add_argument('--baseline', help='JSON с эталонными замерами')
+        parser.add_argument('--save-baseline', help='Куда сохранить замеры')
+        parser.add_argument(
+            '--tolerance',
+            default=0.25,
+            type=float,
+            help='Допустимый рост p95 относительно эталона'
+        )
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден')
+            return user
+        busiest = ShoppingCart.objects.values('user').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        user = User.objects.filter(
+            pk=busiest['user'] if busiest else None
+        ).first() or User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей, запустите generate_fixtures'
+            )
+        return user
+
+    def get_scenarios(self, user):
+        recipe = Recipe.objects.exclude(
+            favorites__user=user
+        ).exclude(shopping_cart__user=user).order_by(
+            '-favorites_count'
+        ).first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            pk__in=Follow.objects.filter(user=user).values('author')
+        ).order_by('-followers_count').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or author is None or ingredient is None:
+            raise CommandError(
+                'Недостаточно данных, запустите generate_fixtures'
+            )
+
+        recipe_url = f'/api/recipes/{recipe.id}/'
+        author_url = f'/api/users/{author.id}/'
+        return [
+            ('tags.list', 'get', '/api/tags/', None),
+            ('ingredients.search', 'get', '/api/ingredients/',
+             {'name': ingredient.name[:3]}),
+            ('ingredients.detail', 'get',
+             f'/api/ingredients/{ingredient.id}/', None),
+            ('recipes.list', 'get', '/api/recipes/', None),
+            ('recipes.list.cursor', 'get', '/api/recipes/', {'cursor': ''}),
+            ('recipes.list.tags', 'get', '/api/recipes/', {'tags': tags}),
+            ('recipes.list.author', 'get', '/api/recipes/',
+             {'author': author.id}),
+            ('recipes.list.favorited', 'get', '/api/recipes/',
+             {'is_favorited': 1}),
+            ('recipes.search', 'get', '/api/recipes/',
+             {'search': recipe.name.split()[0]}),
+            ('recipes.detail', 'get', recipe_url, None),
+            ('recipes.favorite.add', 'post', f'{recipe_url}favorite/', None),
+            ('recipes.favorite.remove', 'delete', f'{recipe_url}favorite/',
+             None),
+            ('recipes.cart.add', 'post', f'{recipe_url}shopping_cart/', None),
+            ('recipes.cart.remove', 'delete', f'{recipe_url}shopping_cart/',
+             None),
+            ('recipes.download_shopping_cart', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('users.list', 'get', '/api/users/', None),
+            ('users.me', 'get', '/api/users/me/', None),
+            ('users.detail', 'get', author_url, None),
+            ('users.subscriptions', 'get', '/api/users/subscriptions/',
+             {'recipes_limit': 3}),
+            ('users.subscribe', 'post', f'{author_url}subscribe/', None),
+            ('users.unsubscribe', 'delete', f'{author_url}subscribe/', None),
+        ]
+
+    def run(self, runner, scenarios, options):
+        results = {name: [] for name, _, _, _ in scenarios}
+        failures = {}
+        for iteration in range(options['warmup'] + options['requests']):
+            for name, method, path, params in scenarios:
+                elapsed, queries, status = runner.request(
+                    method, path, params
+                )
+                if status >= 400:
+                    failures[name] = status
+                if iteration >= options['warmup']:
+                    results[name].append((elapsed, queries))
+        return results, failures
+
+    def summarize(self, samples):
+        timings = [elapsed * 1000 for elapsed, _ in samples]
+        queries = [count for _, count in samples if count is not None]
+        return {
+            'p50': median(timings),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'queries': max(queries) if queries else None,
+            'rps': len(timings) / (sum(timings) / 1000),
+        }
+
+    def report(self, name, summary, status=None):
+        queries = summary['queries']
+        self.stdout.write(
+            f'{name:<32} p50 {summary["p50"]:>8.2f} мс  '
+            f'p95 {summary["p95"]:>8.2f} мс  '
+            f'p99 {summary["p99"]:>8.2f} мс  '
+            f'запросов {"-" if queries is None else queries:>4}  '
+            f'{summary["rps"]:>8.1f} rps'
+            + (f'  HTTP {status}' if status else '')
+        )
+
+    def compare(self, summaries, baseline_path, tolerance):
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        regressions = []
+        for name, summary in summaries.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if (
+                summary['queries'] is not None
+                and expected.get('queries') is not None
+                and summary['queries'] > expected['queries']
+            ):
+                regressions.append(
+                    f'{name}: запросов {summary["queries"]}, '
+                    f'эталон {expected["queries"]}'
+                )
+            if summary['p95'] > expected['p95'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {summary["p95"]:.2f} мс, '
+                    f'эталон {expected["p95"]:.2f} мс'
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        scenarios = [
+            scenario for scenario in self.get_scenarios(user)
+            if not options['only'] or scenario[0] in options['only']
+        ]
+
+        if options['base_url']:
+            runner = HttpRunner(token.key, options['base_url'])
+        else:
+            runner = TestClientRunner(token.key)
+
+        results, failures = self.run(runner, scenarios, options)
+        summaries = {
+            name: self.summarize(samples) for name, samples in results.items()
+        }
+        for name, summary in summaries.items():
+            self.report(name, summary, failures.get(name))
+
+        total = sum(len(samples) for samples in results.values())
+        elapsed = sum(
+            elapsed for samples in results.values() for elapsed, _ in samples
+        )
+        self.stdout.write(
+            f'Всего запросов: {total}, пропускная способность '
+            f'{total / elapsed:.1f} rps'
+        )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as file:
+                json.dump(summaries, file, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            regressions = self.compare(
+                summaries, options['baseline'], options['tolerance']
+            )
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+
+        if failures:
+            raise CommandError(
+                'Ошибочные ответы: ' + ', '.join(
+                    f'{name} (HTTP {status})'
+                    for name, status in failures.items()
+                )
+            )
@@ -0,0 +1,66 @@
+import random
+import time
+from statistics import mean, median
+
+from api.filters import IngredientFilter
+from api.ingredient_index import IngredientIndex
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Ingredient
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Compare ingredient autocomplete index with IngredientFilter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', default=500, type=int)
+        parser.add_argument('--seed', default=0, type=int)
+
+    def measure(self, search, prefixes):
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            search(prefix)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        return timings
+
+    def report(self, title, timings):
+        self.stdout.write(
+            f'{title:<18} mean {mean(timings):>10.1f} мкс  '
+            f'p50 {median(timings):>10.1f} мкс  '
+            f'p95 {percentile(timings, 0.95):>10.1f} мкс'
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Список ингредиентов пуст')
+
+        rng = random.Random(options['seed'])
+        prefixes = [
+            name[:rng.randint(1, min(4, len(name)))]
+            for name in rng.choices(names, k=options['queries'])
+        ]
+
+        index = IngredientIndex(ttl=float('inf'))
+        started = time.perf_counter()
+        index.build()
+        self.stdout.write(
+            f'Индекс построен за '
+            f'{(time.perf_counter() - started) * 1000:.1f} мс '
+            f'({len(names)} ингредиентов)'
+        )
+
+        def filter_search(prefix):
+            return list(IngredientFilter(
+                {'name': prefix}, queryset=Ingredient.objects.all()
+            ).qs.values('id', 'name', 'measurement_unit'))
+
+        self.report('IngredientFilter', self.measure(filter_search, prefixes))
+        self.report('IngredientIndex', self.measure(index.search, prefixes))
@@ -0,0 +1,60 @@
+import time
+from statistics import median
+
+from api.filters import RecipeFilter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.feed import feed_recipes
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+
+
+class Command(BaseCommand):
+    # Использование индексов проверяют тесты api, здесь только замеры.
+    help = 'Show plans and timings of recipe list queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', default=20, type=int)
+
+    def filter_recipes(self, params):
+        return RecipeFilter(
+            params, queryset=Recipe.objects.all()
+        ).qs[:6]
+
+    def get_queries(self, user):
+        return [
+            ('recipes.newest', self.filter_recipes({})),
+            ('recipes.author', self.filter_recipes({'author': user.pk})),
+            ('recipes.cooking_time',
+             self.filter_recipes({'ordering': 'cooking_time'})),
+            ('recipes.popularity',
+             self.filter_recipes({'ordering': 'popularity'})),
+            ('favorites.user', Favorite.objects.filter(user=user)),
+            ('shopping_cart.user', ShoppingCart.objects.filter(user=user)),
+            ('feed.user', feed_recipes(user).with_related()[:6]),
+        ]
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - started)
+        return median(timings) * 1000
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей, запустите generate_fixtures'
+            )
+
+        for name, queryset in self.get_queries(user):
+            elapsed = self.measure(queryset, max(options['repeat'], 1))
+            self.stdout.write(f'{name:<24} {elapsed:>8.2f} мс')
+            if options['verbosity'] > 1:
+                if connection.vendor == 'postgresql':
+                    self.stdout.write(queryset.explain(analyze=True))
+                else:
+                    self.stdout.write(queryset.explain())
@@ -0,0 +1,87 @@
+import time
+from statistics import median
+
+from api.serializers import FastRecipeSerializer, ReadOnlyRecipeSerializer
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from recipes.models import Recipe, User
+
+from rest_framework.renderers import JSONRenderer
+
+
+class Command(BaseCommand):
+    # Совпадение JSON проверяют тесты api, здесь только замеры.
+    help = 'Compare FastRecipeSerializer speed with ReadOnlyRecipeSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', default=100, type=int)
+        parser.add_argument('--repeat', default=20, type=int)
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого строятся ответы'
+        )
+
+    def get_user(self, email):
+        users = User.objects.order_by('id')
+        if email:
+            users = users.filter(email=email)
+        user = users.first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, запустите generate_fixtures'
+            )
+        return user
+
+    def get_request(self, user):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        return request
+
+    def serialize(self, serializer_class, recipes, request):
+        return serializer_class(
+            recipes, many=True, context={'request': request}
+        ).data
+
+    def get_cases(self, user, limit):
+        return [
+            ('list', user, list(Recipe.objects.with_related()[:limit])),
+            ('detail', user, list(
+                Recipe.objects.with_viewer_data(user)[:limit]
+            )),
+            ('anonymous', AnonymousUser(), list(
+                Recipe.objects.with_related()[:limit]
+            )),
+        ]
+
+    def benchmark(self, serializer_class, user, recipes, repeat):
+        renderer = JSONRenderer()
+        request = self.get_request(user)
+        timings = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            renderer.render(self.serialize(serializer_class, recipes, request))
+            timings.append(time.perf_counter() - started)
+        # Первый проход загружает отношения зрителя, его не учитываем.
+        return median(timings[1:]) * 1000
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        cases = self.get_cases(user, options['limit'])
+        if not cases[0][2]:
+            raise CommandError('Нет рецептов, запустите generate_fixtures')
+
+        for name, case_user, recipes in cases:
+            drf = self.benchmark(
+                ReadOnlyRecipeSerializer, case_user, recipes,
+                options['repeat']
+            )
+            fast = self.benchmark(
+                FastRecipeSerializer, case_user, recipes, options['repeat']
+            )
+            self.stdout.write(
+                f'{name:<12} DRF {drf:>8.2f} мс  быстрый {fast:>8.2f} мс  '
+                f'ускорение x{drf / fast:.1f}'
+            )
@@ -0,0 +1,73 @@
+import json
+import os
+
+from api.recipe_import import import_recipes
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.readers import batches, read_json, read_ndjson
+
+User = get_user_model()
+
+READERS = {
+    'json': read_json,
+    'ndjson': read_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from json or ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Email автора импортируемых рецептов'
+        )
+        parser.add_argument(
+            '--format',
+            choices=tuple(READERS),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=500,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        extension = os.path.splitext(options['path'])[1].lstrip('.')
+        read = READERS.get(options['format'] or extension)
+        if read is None:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format'
+            )
+
+        try:
+            author = User.objects.get(email=options['author'])
+        except User.DoesNotExist:
+            raise CommandError('Автор не найден')
+
+        imported = failed = 0
+        try:
+            with open(options['path'], 'r', encoding='utf-8') as file:
+                for offset, batch in enumerate(
+                    batches(read(file), options['batch_size'])
+                ):
+                    created, errors = import_recipes(batch, author)
+                    imported += len(created)
+                    failed += len(errors)
+                    for error in errors:
+                        index = offset * options['batch_size'] + error['index']
+                        self.stderr.write(f'#{index}: ' + json.dumps(
+                            error['errors'], ensure_ascii=False
+                        ))
+
+        except FileNotFoundError:
+            raise CommandError('Файл не найден')
+
+        self.stdout.write(
+            f'Импортировано рецептов: {imported}, с ошибками: {failed}'
+        )
@@ -0,0 +1,166 @@
+import hmac
+import ipaddress
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+from foodgram.metrics import (LATENCY_BUCKETS, QUERY_BUCKETS, SIZE_BUCKETS,
+                              define, observe, registry, render)
+
+_local = threading.local()
+
+define(
+    'foodgram_request_duration_seconds', 'histogram',
+    'Время обработки запроса', LATENCY_BUCKETS
+)
+define(
+    'foodgram_request_sql_queries', 'histogram',
+    'Количество SQL-запросов на запрос', QUERY_BUCKETS
+)
+define(
+    'foodgram_request_sql_duration_seconds', 'histogram',
+    'Время SQL-запросов на запрос', LATENCY_BUCKETS
+)
+define(
+    'foodgram_request_serializer_duration_seconds', 'histogram',
+    'Время сериализации ответа', LATENCY_BUCKETS
+)
+define(
+    'foodgram_response_size_bytes', 'histogram',
+    'Размер ответа', SIZE_BUCKETS
+)
+
+
+def is_allowed(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def has_token(request):
+    # За прокси REMOTE_ADDR - адрес nginx, поэтому снаружи сбор метрик
+    # возможен только с токеном.
+    if not settings.METRICS_TOKEN:
+        return False
+    return hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    )
+
+
+def metrics_view(request):
+    if not (
+        has_token(request)
+        or is_allowed(request.META.get('REMOTE_ADDR', ''))
+    ):
+        raise PermissionDenied
+    registry.flush()
+    return HttpResponse(
+        render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+def get_view_label(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        match = request.resolver_match
+        return match.view_name if match else 'unresolved'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        stats = _local.stats = RequestStats()
+        request.metrics_view = 'unresolved'
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+
+        labels = {'view': request.metrics_view, 'method': request.method}
+        observe(
+            'foodgram_request_duration_seconds',
+            time.perf_counter() - started, **labels
+        )
+        observe('foodgram_request_sql_queries', stats.queries, **labels)
+        observe(
+            'foodgram_request_sql_duration_seconds', stats.sql_time, **labels
+        )
+        observe(
+            'foodgram_request_serializer_duration_seconds',
+            stats.serializer_time, **labels
+        )
+        if response.streaming:
+            response.streaming_content = self.count_streamed(
+                response.streaming_content, labels
+            )
+        else:
+            observe(
+                'foodgram_response_size_bytes', len(response.content),
+                **labels
+            )
+        registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_label(request, view_func)
+
+    def count_streamed(self, content, labels):
+        size = 0
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        observe('foodgram_response_size_bytes', size, **labels)
+
+
+class SerializerTimingMixin:
+    def to_representation(self, instance):
+        stats = getattr(_local, 'stats', None)
+        if stats is None or stats.serializer_depth:
+            return super().to_representation(instance)
+
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializer_depth -= 1
@@ -1,6 +1,161 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import datetime
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+
+        sql, params = query.sql_with_params()
+        key = 'pagination-count:' + md5(
+            f'{self.object_list.db}:{sql}:{params}'.encode()
+        ).hexdigest()
+
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            if count >= settings.PAGINATION_COUNT_CACHE_THRESHOLD:
+                cache.set(
+                    key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT
+                )
+        return count
+
+
+class LimitCursorPagination(CursorPagination):
+    # Курсор хранит весь ключ сортировки, например (created, id), и
+    # следующая страница выбирается условием по ключу, без OFFSET.
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    ordering = ('-created', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def encode_position(self, instance):
+        return json.dumps([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (
+                getattr(instance, field.lstrip('-'))
+                for field in self.ordering
+            )
+        ])
+
+    def get_field(self, name):
+        # В ключе могут быть и аннотации, например даты записей ленты.
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or (
+                len(values) != len(self.ordering)
+            ):
+                raise ValueError
+            return [
+                self.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_keyset_filter(self, position, reverse):
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.queryset = queryset
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        position = None
+        if cursor is not None and cursor.position is not None:
+            position = self.decode_position(cursor.position)
+
+        queryset = queryset.order_by(*(
+            (field[1:] if field.startswith('-') else f'-{field}')
+            if reverse else field
+            for field in self.ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse)
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=self.encode_position(self.page[-1])
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True,
+            position=self.encode_position(self.page[0])
+        ))
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    django_paginator_class = CachedCountPaginator
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = LimitCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
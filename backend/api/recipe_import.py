@@ -0,0 +1,131 @@
+from django.db import connection, transaction
+
+from recipes.counters import change_counter
+from recipes.feed import schedule_fan_out
+from recipes.images import process_image
+from recipes.models import (Ingredient, Recipe, RecipeIngredients, StoredFile,
+                            Tag, User, tags_mask)
+from recipes.search import schedule_index
+
+from rest_framework import serializers
+
+from .serializers import RecipeSerializer
+
+
+class RecipeImportSerializer(RecipeSerializer):
+    tags = serializers.ListField(child=serializers.IntegerField())
+
+    def check_ingredients_exist(self, ingredient_ids):
+        pass
+
+
+def validate_recipes(items):
+    errors = {}
+    valid = []
+
+    for index, item in enumerate(items):
+        serializer = RecipeImportSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+
+    known_ingredients = set(Ingredient.objects.filter(id__in={
+        ingredient['id']
+        for _, data in valid
+        for ingredient in data['ingredients']
+    }).values_list('id', flat=True))
+    tag_bits = dict(Tag.objects.filter(id__in={
+        tag for _, data in valid for tag in data['tags']
+    }).values_list('id', 'bit'))
+
+    checked = []
+    for index, data in valid:
+        item_errors = {}
+        missing_ingredients = sorted({
+            ingredient['id'] for ingredient in data['ingredients']
+        } - known_ingredients)
+        missing_tags = sorted(set(data['tags']) - tag_bits.keys())
+
+        if missing_ingredients:
+            item_errors['ingredients'] = [
+                f'Ингредиенты не найдены: {missing_ingredients}'
+            ]
+        if missing_tags:
+            item_errors['tags'] = [f'Теги не найдены: {missing_tags}']
+
+        if item_errors:
+            errors[index] = item_errors
+        else:
+            data['tags_mask'] = tags_mask(
+                tag_bits[tag] for tag in data['tags']
+            )
+            checked.append((index, data))
+
+    return checked, errors
+
+
+def save_recipes(recipes, author):
+    if not connection.features.can_return_ids_from_bulk_insert:
+        for recipe in recipes:
+            recipe.save()
+        return
+
+    Recipe.objects.bulk_create(recipes)
+    change_counter(User, 'recipes_count', author.pk, len(recipes))
+    StoredFile.objects.add_references(
+        recipe.image.name for recipe in recipes
+    )
+    schedule_index(recipe.pk for recipe in recipes)
+    schedule_fan_out(recipe.pk for recipe in recipes)
+    for recipe in recipes:
+        process_image(recipe.pk, recipe.image.name)
+
+
+@transaction.atomic
+def create_recipes(validated, author):
+    recipes = [
+        Recipe(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=data['image'],
+            tags_mask=data['tags_mask'],
+        )
+        for data in validated
+    ]
+    save_recipes(recipes, author)
+
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+        for recipe, data in zip(recipes, validated)
+        for tag in data['tags']
+    )
+    RecipeIngredients.objects.bulk_create(
+        RecipeIngredients(
+            recipe=recipe,
+            ingredient_id=ingredient['id'],
+            amount=ingredient['amount'],
+        )
+        for recipe, data in zip(recipes, validated)
+        for ingredient in data['ingredients']
+    )
+
+    return recipes
+
+
+def import_recipes(items, author):
+    checked, errors = validate_recipes(items)
+    recipes = []
+    if checked:
+        recipes = create_recipes([data for _, data in checked], author)
+
+    created = [
+        {'index': index, 'id': recipe.pk}
+        for (index, _), recipe in zip(checked, recipes)
+    ]
+    return created, [
+        {'index': index, 'errors': item_errors}
+        for index, item_errors in sorted(errors.items())
+    ]
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from django.shortcuts import get_object_or_404
+from django.db import models, transaction
+from django.http import Http404
 
 from djoser.serializers import (
     UserCreateSerializer as BaseCreateUserSerializer,
@@ -9,16 +10,86 @@ from djoser.serializers import (
 
 from drf_extra_fields.fields import Base64ImageField
 
+from jobs.models import Job
+
+from recipes.images import variant_names
 from recipes.models import Follow, Ingredient, Recipe, RecipeIngredients, Tag
+from recipes.search import schedule_index
 
 from rest_framework import serializers
 from rest_framework.fields import IntegerField, SerializerMethodField
 from rest_framework.relations import PrimaryKeyRelatedField
 
+from .metrics import SerializerTimingMixin
+from .viewer import get_viewer_relations
+
 User = get_user_model()
 
+# Верхняя граница целочисленного первичного ключа.
+RECIPE_ID_MAX = 2 ** 31 - 1
+
+
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None or not limit.isdigit():
+        return None
+    return int(limit)
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.preload_viewer_relations(items)
+        return super().to_representation(items)
+
+
+def get_image_url(image, request):
+    if not image:
+        return None
+    url = image.url
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def get_image_variants(recipe, request):
+    if not recipe.image:
+        return None
+
+    storage = recipe.image.storage
+    urls = {}
+
+    def build_url(name):
+        # Пока превью не готовы, все варианты ведут на исходный файл.
+        if name not in urls:
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[name] = url
+        return urls[name]
+
+    return {
+        variant: {
+            image_format: build_url(
+                name if recipe.image_processed else recipe.image.name
+            )
+            for image_format, name in formats.items()
+        }
+        for variant, formats in variant_names(recipe.image.name).items()
+    }
+
+
+class ImageVariantsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return get_image_variants(recipe, self.context.get('request'))
 
-class TagSerializer(serializers.ModelSerializer):
+
+class TagSerializer(SerializerTimingMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
@@ -30,7 +101,8 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SerializerTimingMixin,
+                           serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
@@ -51,7 +123,7 @@ class CreateUserSerializer(BaseCreateUserSerializer):
         ) + tuple(User.REQUIRED_FIELDS)
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SerializerTimingMixin, BaseUserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
 
     class Meta:
@@ -64,12 +136,17 @@ class UserSerializer(BaseUserSerializer):
             'last_name',
             'is_subscribed',
         )
+        list_serializer_class = ViewerListSerializer
+
+    def preload_viewer_relations(self, users):
+        get_viewer_relations(self.context.get('request')).preload(
+            'follows', [user.pk for user in users]
+        )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj).exists()
+        return get_viewer_relations(self.context.get('request')).has(
+            'follows', obj.pk
+        )
 
 
 class RecipeIngredientsSerializer(serializers.ModelSerializer):
@@ -99,7 +176,8 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SerializerTimingMixin,
+                       serializers.ModelSerializer):
     image = Base64ImageField()
     tags = PrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
@@ -134,24 +212,24 @@ class RecipeSerializer(serializers.ModelSerializer):
                 )
             })
 
-        ingredient_list = []
+        ingredient_ids = {ingredient['id'] for ingredient in ingredients}
 
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item['id']
-            )
-
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError({
-                    'ingredients': (
-                        'Выбранный ингредиент уже добавлен в рецепт'
-                    )
-                })
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError({
+                'ingredients': (
+                    'Выбранный ингредиент уже добавлен в рецепт'
+                )
+            })
 
-            ingredient_list.append(ingredient)
+        self.check_ingredients_exist(ingredient_ids)
 
         return value
 
+    def check_ingredients_exist(self, ingredient_ids):
+        found = Ingredient.objects.filter(id__in=ingredient_ids).count()
+        if found != len(ingredient_ids):
+            raise Http404
+
     def validate_tags(self, value):
         tags = value
 
@@ -162,16 +240,12 @@ class RecipeSerializer(serializers.ModelSerializer):
                 )
             })
 
-        tags_list = []
-
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError({
-                    'tags': (
-                        'Выбранный tag уже прикреплен к рецепту'
-                    )
-                })
-            tags_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError({
+                'tags': (
+                    'Выбранный tag уже прикреплен к рецепту'
+                )
+            })
 
         return value
 
@@ -184,6 +258,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients]
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         tags = validated_data.pop('tags')
@@ -194,27 +269,107 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        current = {
+            item.ingredient_id: item for item in recipe.ingredient_list.all()
+        }
+        submitted = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+
+        removed = current.keys() - submitted.keys()
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        changed = []
+        for ingredient_id, amount in submitted.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredients.objects.bulk_update(changed, ['amount'])
+
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in current
+        ]
+        if added:
+            self.create_ingredients(added, recipe)
+        if removed or added:
+            schedule_index([recipe.pk])
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        tags_data = self.initial_data.get('tags')
-        instance.tags.set(tags_data)
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            self.update_ingredients(
+                validated_data.pop('ingredients'), instance
+            )
 
-        return super().update(instance, validated_data)
+        update_fields = [
+            field for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value
+        ]
+        if update_fields:
+            for field in update_fields:
+                setattr(instance, field, validated_data[field])
+            if 'image' in update_fields:
+                update_fields.append('image_processed')
+            instance.save(update_fields=update_fields)
+
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_viewer_data(request.user).get(
+            pk=instance.pk
+        )
 
         return ReadOnlyRecipeSerializer(instance, context=context).data
 
 
-class ReadOnlyRecipeSerializer(serializers.ModelSerializer):
+class RecipeViewerMixin:
+    def preload_viewer_relations(self, recipes):
+        relations = get_viewer_relations(self.context.get('request'))
+        recipe_ids = [recipe.pk for recipe in recipes]
+        relations.preload('favorites', recipe_ids)
+        relations.preload('shopping_cart', recipe_ids)
+        relations.preload('follows', [recipe.author_id for recipe in recipes])
+
+    def remember_author_subscription(self, recipe):
+        if hasattr(recipe, 'is_author_subscribed'):
+            get_viewer_relations(self.context.get('request')).remember(
+                'follows', recipe.author_id, recipe.is_author_subscribed
+            )
+
+    def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_viewer_relations(self.context.get('request')).has(
+            'favorites', obj.pk
+        )
+
+    def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_viewer_relations(self.context.get('request')).has(
+            'shopping_cart', obj.pk
+        )
+
+
+class ReadOnlyRecipeSerializer(SerializerTimingMixin, RecipeViewerMixin,
+                               serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    images = ImageVariantsField()
 
     ingredients = SerializerMethodField()
     is_favorited = SerializerMethodField(read_only=True)
@@ -232,34 +387,85 @@ class ReadOnlyRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
         )
+        list_serializer_class = ViewerListSerializer
 
-    def get_ingredients(self, obj):
-        ingredients = obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipe__amount')
-        )
-        return ingredients
-
-    def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.favorites.filter(recipe=obj).exists()
+    def to_representation(self, instance):
+        self.remember_author_subscription(instance)
+        return super().to_representation(instance)
 
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.shopping_cart.filter(recipe=obj).exists()
+    def get_ingredients(self, obj):
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredient_list.all()
+        ]
+
+
+class FastRecipeSerializer(SerializerTimingMixin, RecipeViewerMixin,
+                           serializers.BaseSerializer):
+    # Тот же JSON, что у ReadOnlyRecipeSerializer, но без обхода полей DRF:
+    # словари собираются напрямую из строк, загруженных with_related().
+    # Порядок ключей должен совпадать, сверка - check_recipe_serializer.
 
+    class Meta:
+        list_serializer_class = ViewerListSerializer
 
-class RecipeInfoSerializer(serializers.ModelSerializer):
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        relations = get_viewer_relations(request)
+        self.remember_author_subscription(recipe)
+        author = recipe.author
+
+        return {
+            'id': recipe.id,
+            'tags': [
+                {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in recipe.tags.all()
+            ],
+            'author': {
+                'email': author.email,
+                'id': author.id,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+                'is_subscribed': relations.has('follows', author.id),
+            },
+            'ingredients': [
+                {
+                    'id': item.ingredient.id,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_list.all()
+            ],
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'name': recipe.name,
+            'image': get_image_url(recipe.image, request),
+            'images': get_image_variants(recipe, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
+
+class RecipeInfoSerializer(SerializerTimingMixin,
+                           serializers.ModelSerializer):
     image = Base64ImageField()
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -267,6 +473,7 @@ class RecipeInfoSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time'
         )
         read_only_fields = (
@@ -277,7 +484,8 @@ class RecipeInfoSerializer(serializers.ModelSerializer):
         )
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SerializerTimingMixin,
+                       serializers.ModelSerializer):
 
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
@@ -303,17 +511,43 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        return True
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'latest_recipes'):
+            return RecipeInfoSerializer(obj.latest_recipes, many=True).data
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
+        limit = get_recipes_limit(request)
         queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
+        if limit is not None:
+            queryset = queryset[:limit]
         return RecipeInfoSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
+
+
+class JobSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'status',
+            'attempts',
+            'result',
+            'created',
+            'finished',
+        )
+
+    def get_result(self, obj):
+        return obj.result_data
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=RECIPE_ID_MAX),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_ITEMS,
+    )
@@ -0,0 +1,139 @@
+import csv
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Sum
+
+from jobs.queue import enqueue
+
+from recipes.models import RecipeIngredients
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_CHUNK_SIZE = 64 * 1024
+SHOPPING_LIST_PRIORITY = 20
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def format_row(row):
+    return (
+        f'{row["ingredient__name"]} — '
+        f'{row["amount"]}'
+        f'{row["ingredient__measurement_unit"]}'
+    )
+
+
+def render_txt(rows):
+    for number, row in enumerate(rows):
+        yield ('\n' if number else '') + format_row(row)
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(
+        ('Ингредиент', 'Количество', 'Единицы измерения')
+    )
+    for row in rows:
+        yield writer.writerow((
+            row['ingredient__name'],
+            row['amount'],
+            row['ingredient__measurement_unit'],
+        ))
+
+
+def register_pdf_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+
+
+def render_pdf(rows):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    register_pdf_font()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - 50
+    y = top
+
+    pdf.setFont(PDF_FONT_NAME, 16)
+    pdf.drawString(50, y, 'Список покупок')
+    y -= 30
+    pdf.setFont(PDF_FONT_NAME, 12)
+
+    for row in rows:
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(PDF_FONT_NAME, 12)
+            y = top
+        pdf.drawString(50, y, format_row(row))
+        y -= 18
+
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+RENDERERS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def get_shopping_list(user_id):
+    return RecipeIngredients.objects.filter(
+        recipe__shopping_cart__user_id=user_id
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+    ).annotate(
+        amount=Sum('amount')
+    ).order_by('ingredient__name')
+
+
+def render_shopping_list(user_id, export_format):
+    render, _ = RENDERERS[export_format]
+    content = b''.join(
+        chunk.encode() if isinstance(chunk, str) else chunk
+        for chunk in render(get_shopping_list(user_id).iterator())
+    )
+    name = default_storage.save(
+        f'shopping_lists/{uuid4().hex}.{export_format}',
+        ContentFile(content)
+    )
+    enqueue(
+        'api.shopping_list.delete_shopping_list', name,
+        delay=settings.SHOPPING_LIST_TTL
+    )
+    return {'url': default_storage.url(name)}
+
+
+def delete_shopping_list(name):
+    default_storage.delete(name)
+
+
+def enqueue_shopping_list(user, export_format):
+    return enqueue(
+        'api.shopping_list.render_shopping_list', user.pk, export_format,
+        user=user, priority=SHOPPING_LIST_PRIORITY
+    )
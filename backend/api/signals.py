@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, User
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .ingredient_index import ingredient_index
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+# QuerySet.update() сигналов не отправляет: блокировка пользователей
+# массовым обновлением вступит в силу после TOKEN_AUTH_SHARED_CACHE_TTL.
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, created, **kwargs):
+    if not created:
+        forget_tokens(list(Token.objects.filter(user=instance).values_list(
+            'key', flat=True
+        )))
@@ -0,0 +1,549 @@
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from recipes.feed import feed_recipes, rebuild
+from recipes.models import (DataVersion, Favorite, Follow,
+                            INGREDIENT_CATALOG, Ingredient, Recipe,
+                            RecipeIngredients, ShoppingCart, Tag, User)
+
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import token_cache
+from .filters import RecipeFilter
+from .ingredient_index import IngredientIndex
+from .serializers import FastRecipeSerializer, ReadOnlyRecipeSerializer
+
+
+def create_recipes(count):
+    tags = [
+        Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}',
+                           color=color)
+        for number, color in enumerate(('#E26C2D', '#49B64E', '#8775D2'))
+    ]
+    Ingredient.objects.bulk_create([
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(count + 1)
+    ])
+    ingredients = list(Ingredient.objects.order_by('id'))
+    authors = [
+        User.objects.create_user(
+            email=f'author{number}@example.com',
+            username=f'author{number}',
+            first_name='Автор',
+            last_name=str(number),
+            password='password',
+        )
+        for number in range(3)
+    ]
+
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=number % 30 + 1,
+            image=f'recipes/{number:02x}/{number:064x}.png',
+        )
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        recipes.append(recipe)
+    RecipeIngredients.objects.bulk_create([
+        RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=2)
+        for number, recipe in enumerate(recipes)
+        for ingredient in ingredients[number:number + 2]
+    ])
+    return authors, recipes
+
+
+class RecipeQueryBudgetTest(TestCase):
+    # Число запросов не должно зависеть от размера страницы.
+    LIST_QUERIES = {'anonymous': 6, 'authenticated': 9}
+    # Без фасетов (теги и агрегат), курсор ещё и без COUNT.
+    NEXT_PAGE_QUERIES = {'anonymous': 4, 'authenticated': 7}
+    DETAIL_QUERIES = {'anonymous': 3, 'authenticated': 3}
+
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_recipes(60)
+        cls.viewer = User.objects.create_user(
+            email='viewer@example.com',
+            username='viewer',
+            first_name='Читатель',
+            last_name='Читатель',
+            password='password',
+        )
+        Follow.objects.create(user=cls.viewer, author=authors[0])
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.viewer, recipe=recipe)
+            for recipe in cls.recipes[::3]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=cls.viewer, recipe=recipe)
+            for recipe in cls.recipes[::4]
+        ])
+
+    def get_clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.viewer)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def test_list_queries(self):
+        for viewer, client in self.get_clients().items():
+            for limit in (6, 50):
+                with self.subTest(viewer=viewer, limit=limit):
+                    with self.assertNumQueries(self.LIST_QUERIES[viewer]):
+                        response = client.get(
+                            '/api/recipes/', {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_next_pages_skip_facets(self):
+        for viewer, client in self.get_clients().items():
+            first = client.get('/api/recipes/', {'cursor': ''})
+            self.assertIn('tag_facets', first.data)
+            for url, params, count_queries in (
+                ('/api/recipes/', {'page': 2}, 1),
+                (first.data['next'], None, 0),
+            ):
+                with self.subTest(viewer=viewer, url=url):
+                    with self.assertNumQueries(
+                        self.NEXT_PAGE_QUERIES[viewer] - 1 + count_queries
+                    ):
+                        response = client.get(url, params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotIn('tag_facets', response.data)
+
+    def test_detail_queries(self):
+        for viewer, client in self.get_clients().items():
+            for recipe in self.recipes[:2]:
+                with self.subTest(viewer=viewer, recipe=recipe.pk):
+                    with self.assertNumQueries(self.DETAIL_QUERIES[viewer]):
+                        response = client.get(f'/api/recipes/{recipe.pk}/')
+                    self.assertEqual(response.status_code, 200)
+
+
+class FastRecipeSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_recipes(12)
+        cls.viewer = authors[1]
+        Follow.objects.create(user=cls.viewer, author=authors[0])
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.viewer, recipe=recipe) for recipe in recipes[::2]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=cls.viewer, recipe=recipe)
+            for recipe in recipes[::3]
+        ])
+
+    def render(self, serializer_class, recipes, user):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        return JSONRenderer().render(serializer_class(
+            recipes, many=True, context={'request': request}
+        ).data)
+
+    def test_same_json(self):
+        cases = (
+            ('list', self.viewer, Recipe.objects.with_related()),
+            ('detail', self.viewer,
+             Recipe.objects.with_viewer_data(self.viewer)),
+            ('anonymous', AnonymousUser(), Recipe.objects.with_related()),
+        )
+        for name, user, queryset in cases:
+            with self.subTest(name):
+                recipes = list(queryset)
+                self.assertEqual(
+                    self.render(FastRecipeSerializer, recipes, user),
+                    self.render(ReadOnlyRecipeSerializer, recipes, user)
+                )
+
+
+class RecipeListsTest(TestCase):
+    LISTS = (
+        ('favorite', Favorite, 'favorites_count'),
+        ('shopping_cart', ShoppingCart, 'in_carts_count'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        _, recipes = create_recipes(4)
+        cls.recipe_ids = [recipe.pk for recipe in recipes]
+        cls.viewer = User.objects.create_user(
+            email='viewer@example.com',
+            username='viewer',
+            password='password',
+        )
+        cls.other = User.objects.create_user(
+            email='other@example.com',
+            username='other',
+            password='password',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def get_counts(self, counter):
+        return dict(Recipe.objects.filter(
+            pk__in=self.recipe_ids
+        ).values_list('pk', counter))
+
+    def test_single(self):
+        pk = self.recipe_ids[0]
+        for url, model, counter in self.LISTS:
+            with self.subTest(url):
+                path = f'/api/recipes/{pk}/{url}/'
+                self.assertEqual(self.client.post(path).status_code, 201)
+                self.assertEqual(self.client.post(path).status_code, 400)
+                self.assertEqual(self.get_counts(counter)[pk], 1)
+                self.assertEqual(self.client.delete(path).status_code, 204)
+                self.assertEqual(self.client.delete(path).status_code, 400)
+                self.assertEqual(self.get_counts(counter)[pk], 0)
+                self.assertFalse(model.objects.exists())
+
+    def test_single_missing_recipe(self):
+        for url, _, _ in self.LISTS:
+            # Удаление несуществующего рецепта - как удаление не из списка.
+            for pk, delete_status in (
+                (max(self.recipe_ids) + 1, 400), (10 ** 20, 404)
+            ):
+                with self.subTest(url, pk=pk):
+                    path = f'/api/recipes/{pk}/{url}/'
+                    self.assertEqual(self.client.post(path).status_code, 404)
+                    self.assertEqual(
+                        self.client.delete(path).status_code, delete_status
+                    )
+        self.assertEqual(
+            self.client.get(f'/api/recipes/{10 ** 20}/').status_code, 404
+        )
+
+    def test_batch(self):
+        first, second, third, _ = self.recipe_ids
+        missing = max(self.recipe_ids) + 1
+        for url, model, counter in self.LISTS:
+            with self.subTest(url):
+                model.objects.create(user=self.other, recipe_id=first)
+                Recipe.objects.filter(pk=first).update(**{counter: 1})
+                path = f'/api/recipes/{url}/'
+
+                response = self.client.post(
+                    path, {'recipes': [first, second]}, format='json'
+                )
+                self.assertEqual(response.data, {'added': 2})
+                # Частично: second уже в списке, missing не существует.
+                response = self.client.post(
+                    path, {'recipes': [second, third, missing]},
+                    format='json'
+                )
+                self.assertEqual(response.data, {'added': 1})
+                self.assertEqual(
+                    self.get_counts(counter),
+                    {first: 2, second: 1, third: 1, self.recipe_ids[3]: 0}
+                )
+
+                response = self.client.delete(
+                    path, {'recipes': [first, second, third]}, format='json'
+                )
+                self.assertEqual(response.data, {'removed': 3})
+                response = self.client.delete(
+                    path, {'recipes': [first, missing]}, format='json'
+                )
+                self.assertEqual(response.data, {'removed': 0})
+                self.assertEqual(
+                    self.get_counts(counter),
+                    {first: 1, second: 0, third: 0, self.recipe_ids[3]: 0}
+                )
+
+    def test_batch_invalid_ids(self):
+        for url, _, _ in self.LISTS:
+            for recipes in ([], [0], [10 ** 20], ['id']):
+                with self.subTest(url, recipes=recipes):
+                    response = self.client.post(
+                        f'/api/recipes/{url}/', {'recipes': recipes},
+                        format='json'
+                    )
+                    self.assertEqual(response.status_code, 400)
+
+
+class SubscriptionRecipesTest(TestCase):
+    def test_latest_recipes_follow_created(self):
+        authors, recipes = create_recipes(6)
+        viewer = User.objects.create_user(
+            email='viewer@example.com',
+            username='viewer',
+            password='password',
+        )
+        Follow.objects.create(user=viewer, author=authors[0])
+        own = [recipe for recipe in recipes if recipe.author == authors[0]]
+        # Импортированные рецепты: дата не совпадает с порядком id.
+        for days, recipe in enumerate(own):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created=timezone.now() - timedelta(days=len(own) - days)
+            )
+        Recipe.objects.filter(pk=own[0].pk).update(created=timezone.now())
+
+        client = APIClient()
+        client.force_authenticate(viewer)
+        response = client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        latest = response.data['results'][0]['recipes']
+        self.assertEqual([recipe['id'] for recipe in latest], [own[0].pk])
+
+
+class IngredientIndexTest(TestCase):
+    def test_catalog_change_in_other_process(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        index = IngredientIndex(ttl=300, check_interval=0)
+        index.build()
+        self.assertEqual(len(index.search('сол')), 1)
+
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Солод', measurement_unit='г')]
+        )
+        DataVersion.objects.bump(INGREDIENT_CATALOG)
+        self.assertFalse(index.is_ready)
+        index.build()
+        self.assertEqual(len(index.search('сол')), 2)
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_recipes(25)
+        # Одинаковая дата у всех строк: порядок решает только id.
+        Recipe.objects.update(created=timezone.now())
+        cls.recipe_ids = [recipe.pk for recipe in recipes]
+        cls.viewer = User.objects.create_user(
+            email='viewer@example.com',
+            username='viewer',
+            password='password',
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.viewer, author=author) for author in authors[:2]
+        ])
+        cls.feed_ids = sorted(
+            (recipe.pk for recipe in recipes
+             if recipe.author in authors[:2]),
+            reverse=True
+        )
+
+    def walk(self, url, params, link='next', client=None):
+        client = client or APIClient()
+        response = client.get(url, params)
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            if response.data[link] is None:
+                return pages
+            self.assertLess(len(pages), 30)
+            response = client.get(response.data[link])
+
+    def test_ties_on_created(self):
+        pages = self.walk('/api/recipes/', {'cursor': '', 'limit': 4})
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, sorted(self.recipe_ids, reverse=True))
+        self.assertEqual(len(pages), 7)
+
+    def test_previous_pages(self):
+        client = APIClient()
+        response = client.get('/api/recipes/', {'cursor': '', 'limit': 4})
+        for _ in range(3):
+            response = client.get(response.data['next'])
+        back = self.walk(response.data['previous'], None, link='previous')
+        self.assertEqual(
+            [pk for page in reversed(back) for pk in page],
+            sorted(self.recipe_ids, reverse=True)[:12]
+        )
+
+    def test_ties_on_ordering(self):
+        # Группы одинаковых значений длиннее страницы.
+        for number, pk in enumerate(self.recipe_ids):
+            Recipe.objects.filter(pk=pk).update(
+                cooking_time=number % 2 + 1, favorites_count=number % 3
+            )
+        recipes = Recipe.objects.all()
+        for ordering, key in (
+            ('cooking_time', lambda recipe: (recipe.cooking_time, recipe.pk)),
+            ('popularity',
+             lambda recipe: (-recipe.favorites_count, -recipe.pk)),
+        ):
+            with self.subTest(ordering=ordering):
+                pages = self.walk('/api/recipes/', {
+                    'cursor': '', 'limit': 4, 'ordering': ordering
+                })
+                self.assertEqual(
+                    [pk for page in pages for pk in page],
+                    [recipe.pk for recipe in sorted(recipes, key=key)]
+                )
+
+    def walk_feed(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        pages = self.walk(
+            '/api/recipes/feed/', {'limit': 4}, client=client
+        )
+        return [pk for page in pages for pk in page]
+
+    def test_feed(self):
+        rebuild()
+        self.assertEqual(self.walk_feed(), self.feed_ids)
+
+    def test_feed_with_pulled_authors(self):
+        # Все авторы «популярные»: их рецепты читаются без FeedEntry.
+        with self.settings(FEED_FANOUT_LIMIT=0):
+            self.assertEqual(self.walk_feed(), self.feed_ids)
+
+    def test_invalid_cursor(self):
+        response = APIClient().get('/api/recipes/', {'cursor': 'cD1bMV0='})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp(),
+        },
+    },
+    TOKEN_AUTH_SHARED_CACHE='shared',
+    TOKEN_AUTH_REVALIDATE_INTERVAL=0,
+)
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        caches['shared'].clear()
+        self.user = User.objects.create_user(
+            email='viewer@example.com',
+            username='viewer',
+            password='password',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_cached_lookup(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        # Только сами теги, без authtoken_token и пользователя.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_in_other_worker(self):
+        self.client.get('/api/users/me/')
+        # Копия записи в локальном кэше другого воркера.
+        stale = token_cache.get(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        token_cache.set(self.token.key, stale)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(TOKEN_AUTH_REVALIDATE_INTERVAL=60)
+    def test_local_hit_skips_shared_cache(self):
+        self.client.get('/api/users/me/')
+        with mock.patch.object(
+            caches['shared'], 'get', side_effect=AssertionError
+        ):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_after_generation_eviction(self):
+        self.client.get('/api/users/me/')
+        caches['shared'].clear()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='')
+    def test_no_local_cache_without_shared(self):
+        self.client.get('/api/users/me/')
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_process_local_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.client.get('/api/users/me/')
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, _ = create_recipes(10)
+        cls.user = authors[0]
+
+    def filter_recipes(self, params):
+        return RecipeFilter(params, queryset=Recipe.objects.all()).qs[:6]
+
+    def get_checks(self):
+        return [
+            ('recipes.newest', self.filter_recipes({}),
+             ('recipe_created_id_idx',)),
+            ('recipes.author', self.filter_recipes({'author': self.user.pk}),
+             ('recipe_author_created_idx',)),
+            ('recipes.cooking_time',
+             self.filter_recipes({'ordering': 'cooking_time'}),
+             ('recipe_cooking_time_idx',)),
+            ('recipes.popularity',
+             self.filter_recipes({'ordering': 'popularity'}),
+             ('recipe_popularity_idx',)),
+            ('favorites.user', Favorite.objects.filter(user=self.user),
+             ('user_recipe_unique', 'sqlite_autoindex_recipes_favorite')),
+            ('shopping_cart.user', ShoppingCart.objects.filter(user=self.user),
+             ('user_recipe_shopping_unique',
+              'sqlite_autoindex_recipes_shoppingcart')),
+            ('feed.user', feed_recipes(self.user).with_related()[:6],
+             ('feed_user_created_idx',)),
+        ]
+
+    def test_indexes(self):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик иначе выберет seq scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset, indexes in self.get_checks():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertTrue(
+                    any(index in plan for index in indexes), plan
+                )
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(
+    METRICS_ALLOWED_NETWORKS=['127.0.0.1/32'], METRICS_TOKEN='secret'
+)
+class MetricsAccessTest(TestCase):
+    def test_access(self):
+        client = APIClient()
+        for address, authorization, status_code in (
+            ('127.0.0.1', '', 200),
+            # Адрес nginx в сети docker.
+            ('172.18.0.5', '', 403),
+            ('172.18.0.5', 'Bearer wrong', 403),
+            ('172.18.0.5', 'Bearer secret', 200),
+        ):
+            with self.subTest(address=address, authorization=authorization):
+                response = client.get(
+                    '/api/_metrics', REMOTE_ADDR=address,
+                    HTTP_AUTHORIZATION=authorization
+                )
+                self.assertEqual(response.status_code, status_code)
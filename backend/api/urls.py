@@ -2,8 +2,9 @@ from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipeViewSet, SubscribeViewSet,
-                    TagViewSet, UserViewSet)
+from .metrics import metrics_view
+from .views import (IngredientViewSet, JobViewSet, RecipeViewSet,
+                    SubscribeViewSet, TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -18,8 +19,10 @@ router.register(
 router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
+router.register('jobs', JobViewSet)
 
 urlpatterns = [
+    path('_metrics', metrics_view, name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -0,0 +1,46 @@
+from recipes.models import Favorite, Follow, ShoppingCart
+
+RELATIONS = {
+    'follows': (Follow, 'author_id'),
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+}
+
+
+class ViewerRelations:
+    def __init__(self, user):
+        self.user = user
+        self.is_anonymous = user is None or user.is_anonymous
+        self._known = {relation: {} for relation in RELATIONS}
+
+    def remember(self, relation, pk, value):
+        self._known[relation][pk] = value
+
+    def preload(self, relation, pks):
+        known = self._known[relation]
+        missing = {pk for pk in pks if pk not in known}
+        if self.is_anonymous or not missing:
+            return
+
+        model, field = RELATIONS[relation]
+        found = set(model.objects.filter(
+            user=self.user, **{f'{field}__in': missing}
+        ).values_list(field, flat=True))
+        for pk in missing:
+            known[pk] = pk in found
+
+    def has(self, relation, pk):
+        if self.is_anonymous:
+            return False
+        if pk not in self._known[relation]:
+            self.preload(relation, [pk])
+        return self._known[relation][pk]
+
+
+def get_viewer_relations(request):
+    if request is None:
+        return ViewerRelations(None)
+    relations = getattr(request, '_viewer_relations', None)
+    if relations is None:
+        relations = request._viewer_relations = ViewerRelations(request.user)
+    return relations
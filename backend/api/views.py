@@ -1,32 +1,48 @@
 from datetime import datetime
+from itertools import chain
 
-from api.pagination import LimitPageNumberPagination
+from api.pagination import LimitCursorPagination, LimitPageNumberPagination
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from django_filters.rest_framework import DjangoFilterBackend
 
 from djoser.views import UserViewSet as BaseUserViewSet
 
+from jobs.models import Job
+
+from recipes.feed import FEED_ORDERING, feed_recipes
+from recipes.lists import add_recipes, remove_recipes
 from recipes.models import (Favorite, Follow, Ingredient, Recipe,
-                            RecipeIngredients, ShoppingCart, Tag)
+                            ShoppingCart, Tag)
 
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
 
-from .filters import IngredientFilter, RecipeFilter
+from .filters import IngredientFilter, RECIPE_ORDERING, RecipeFilter
+from .ingredient_index import ingredient_index
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (FollowSerializer, IngredientSerializer,
-                          ReadOnlyRecipeSerializer, RecipeInfoSerializer,
-                          RecipeSerializer, TagSerializer, UserSerializer)
+from .recipe_import import import_recipes
+from .serializers import (FastRecipeSerializer, FollowSerializer,
+                          IngredientSerializer, JobSerializer,
+                          RECIPE_ID_MAX, ReadOnlyRecipeSerializer,
+                          RecipeIdsSerializer, RecipeInfoSerializer,
+                          RecipeSerializer, TagSerializer, UserSerializer,
+                          get_recipes_limit)
+from .shopping_list import (ExportContentNegotiation, RENDERERS,
+                            enqueue_shopping_list, get_shopping_list)
 
 User = get_user_model()
 
+EMPTY_SHOPPING_LIST_MESSAGE = 'Ваш список продуктов пуст'
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
@@ -43,12 +59,21 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = (IngredientFilter)
     filter_backends = (DjangoFilterBackend,)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            ingredients = ingredient_index.search(name)
+            if ingredients is not None:
+                return Response(ingredients)
+        return super().list(request, *args, **kwargs)
+
 
 class UserViewSet(BaseUserViewSet):
     queryset = User.objects.all()
 
     serializer_class = UserSerializer
     pagination_class = LimitPageNumberPagination
+    cursor_ordering = ('-id',)
 
     @action(
         detail=False,
@@ -57,8 +82,20 @@ class UserViewSet(BaseUserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author'
+        ).order_by('-id')
         pages = self.paginate_queryset(queryset)
+
+        recipes = {}
+        for recipe in Recipe.objects.latest_for_authors(
+            [follow.author_id for follow in pages],
+            get_recipes_limit(request)
+        ):
+            recipes.setdefault(recipe.author_id, []).append(recipe)
+        for follow in pages:
+            follow.latest_recipes = recipes.get(follow.author_id, [])
+
         serializer = FollowSerializer(
             pages,
             many=True,
@@ -83,6 +120,7 @@ class SubscribeViewSet(viewsets.ModelViewSet):
 
         return (author, user, follow)
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
 
         author, user, follow = self.get_data()
@@ -138,37 +176,143 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_ordering(self):
+        if self.action == 'feed':
+            return FEED_ORDERING
+        return RECIPE_ORDERING.get(
+            self.request.query_params.get('ordering'),
+            RECIPE_ORDERING['newest']
+        )
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Recipe.objects.with_related()
+        return Recipe.objects.with_viewer_data(self.request.user)
+
+    def get_tag_facets(self):
+        params = self.request.query_params.copy()
+        params.pop('tags', None)
+        queryset = self.filterset_class(
+            params, queryset=self.get_queryset(), request=self.request
+        ).qs
+        return queryset.tag_counts(Tag.objects.all())
+
+    def is_first_page(self):
+        params = self.request.query_params
+        return not params.get('cursor') and params.get('page', '1') == '1'
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Фасеты не зависят от страницы: считаем их только для первой,
+        # следующие страницы и курсор обходятся без второго агрегата.
+        if self.is_first_page():
+            response.data['tag_facets'] = self.get_tag_facets()
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        # Лента новая и всегда листается курсором: без COUNT и OFFSET.
+        queryset = self.filter_queryset(
+            feed_recipes(request.user).with_related()
+        )
+        paginator = LimitCursorPagination()
+        pages = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(pages, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
+            if settings.RECIPE_FAST_SERIALIZER:
+                return FastRecipeSerializer
             return ReadOnlyRecipeSerializer
         return RecipeSerializer
 
+    def get_recipe_pk(self, pk):
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        if not 1 <= pk <= RECIPE_ID_MAX:
+            raise Http404
+        return pk
+
+    def get_object(self):
+        self.get_recipe_pk(self.kwargs[self.lookup_field])
+        return super().get_object()
+
     def add_recipe(self, model, user, pk, message):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        pk = self.get_recipe_pk(pk)
+        if not add_recipes(model, user, [pk]):
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': f'Рецепт уже добавлен в список {message}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = RecipeInfoSerializer(recipe)
-
+        serializer = RecipeInfoSerializer(get_object_or_404(Recipe, id=pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, user, pk, message):
-        recipe = model.objects.filter(user=user, recipe__id=pk)
-        if recipe.exists():
-            recipe.delete()
+        if remove_recipes(model, user, [self.get_recipe_pk(pk)]):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': f'Рецепта нет в списке {message}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def change_recipes(self, model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return Response(
+                {'added': add_recipes(model, request.user, recipe_ids)}
+            )
+        return Response(
+            {'removed': remove_recipes(model, request.user, recipe_ids)}
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk(self, request):
+        recipes = request.data
+
+        if not isinstance(recipes, list) or not recipes:
+            return Response(
+                {'errors': 'Передайте непустой список рецептов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(recipes) > settings.RECIPE_IMPORT_MAX_ITEMS:
+            return Response(
+                {'errors': (
+                    'Можно импортировать не более '
+                    f'{settings.RECIPE_IMPORT_MAX_ITEMS} рецептов за раз'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        created, errors = import_recipes(recipes, request.user)
+
+        return Response(
+            {'created': created, 'errors': errors},
+            status=(
+                status.HTTP_201_CREATED if created
+                else status.HTTP_400_BAD_REQUEST
+            )
+        )
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -191,52 +335,85 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_recipe(ShoppingCart, request.user, pk, message)
         return self.delete_recipe(ShoppingCart, request.user, pk, message)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-batch',
+    )
+    def favorite_batch(self, request):
+        return self.change_recipes(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+    )
+    def shopping_cart_batch(self, request):
+        return self.change_recipes(ShoppingCart, request)
+
     @action(
         detail=False,
         methods=('get',),
         permission_classes=(IsAuthenticated,),
+        content_negotiation_class=ExportContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        user = request.user
+        export_format = request.query_params.get('format', 'txt')
 
-        if not user.shopping_cart.exists():
+        if export_format not in RENDERERS:
             return Response(
-                {'errors': 'Ваш список продуктов пуст'},
+                {'errors': (
+                    'Доступные форматы списка: ' + ', '.join(RENDERERS)
+                )},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        ingredients = RecipeIngredients.objects.filter(
-            recipe__shopping_cart__user=user
-        )
-
-        ingredients_list = {}
-
-        for ingredient in ingredients:
-            name = ingredient.ingredient.name
-            amount = ingredient.amount
-            measurement_unit = ingredient.ingredient.measurement_unit
+        ingredients = get_shopping_list(request.user.pk)
+        if request.query_params.get('background') == '1':
+            if not ingredients.exists():
+                return Response(
+                    {'errors': EMPTY_SHOPPING_LIST_MESSAGE},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            job = enqueue_shopping_list(request.user, export_format)
+            return Response(
+                JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+            )
 
-            if name not in ingredients_list:
-                ingredients_list[name] = {
-                    'amount': amount,
-                    'measurement_unit': measurement_unit
-                }
-            else:
-                ingredients_list[name]['amount'] += amount
+        ingredients = ingredients.iterator()
+        first = next(ingredients, None)
+        if first is None:
+            return Response(
+                {'errors': EMPTY_SHOPPING_LIST_MESSAGE},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        shopping_list = '\n'.join([
+        render, content_type = RENDERERS[export_format]
+        today = datetime.today()
 
-            f'{ingredient} — '
-            f'{ingredients_list[ingredient]["amount"]}'
-            f'{ingredients_list[ingredient]["measurement_unit"]}'
+        filename = f'Shopping list {today:%Y-%m-%d}.{export_format}'
+        response = StreamingHttpResponse(
+            render(chain((first,), ingredients)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
 
-            for ingredient in ingredients_list
-        ])
+        return response
 
-        today = datetime.today()
 
-        filename = f'Shopping list {today:%Y-%m-%d}.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
 
-        return response
+    def get_queryset(self):
+        # Статус задачи обновляется на основной базе раньше, чем на репликах.
+        return Job.objects.using(DEFAULT_DB_ALIAS).filter(
+            user=self.request.user
+        )
@@ -0,0 +1,238 @@
+import logging
+import os
+import select
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from foodgram.metrics import define, inc, observe, set_gauge
+
+logger = logging.getLogger(__name__)
+
+define(
+    'foodgram_db_pool_connections', 'gauge',
+    'Соединения пула по состоянию'
+)
+define(
+    'foodgram_db_pool_wait_seconds', 'histogram',
+    'Ожидание свободного соединения',
+    (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+define(
+    'foodgram_db_pool_events_total', 'counter',
+    'События пула соединений'
+)
+
+# psycopg2.extensions.TRANSACTION_STATUS_IDLE
+TRANSACTION_STATUS_IDLE = 0
+
+POOL_DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_AGE': 600,
+    'CHECK_INTERVAL': 30,
+}
+
+
+class ConnectionPool:
+    def __init__(self, alias, size, timeout, max_age, check_interval):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.idle = []
+        self.created = {}
+
+    def event(self, name):
+        inc('foodgram_db_pool_events_total', alias=self.alias, event=name)
+
+    def report(self):
+        in_use = len(self.created) - len(self.idle)
+        set_gauge(
+            'foodgram_db_pool_connections', len(self.idle),
+            alias=self.alias, state='idle'
+        )
+        set_gauge(
+            'foodgram_db_pool_connections', in_use,
+            alias=self.alias, state='in_use'
+        )
+
+    def is_expired(self, connection):
+        return time.monotonic() - self.created[id(connection)] > self.max_age
+
+    def has_pending_input(self, connection):
+        # Сервер, закрывший соединение (перезапуск, failover), присылает
+        # FATAL и EOF: сокет простаивающего соединения становится читаемым.
+        try:
+            readable, _, _ = select.select([connection.fileno()], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def is_healthy(self, connection, released):
+        if getattr(connection, 'closed', False):
+            return False
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if self.has_pending_input(connection):
+            return False
+        if time.monotonic() - released < self.check_interval:
+            return True
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def discard(self, connection):
+        with self.lock:
+            self.created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            logger.debug('Соединение уже закрыто', exc_info=True)
+        self.event('discarded')
+
+    def take_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, released = self.idle.pop()
+            if (
+                not self.is_expired(connection)
+                and self.is_healthy(connection, released)
+            ):
+                self.event('reused')
+                return connection
+            self.discard(connection)
+
+    def acquire(self, connect):
+        if self.pid != os.getpid():
+            self.reset()
+
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=self.timeout):
+            self.event('timeout')
+            raise OperationalError(
+                'Нет свободных соединений с базой данных '
+                f'«{self.alias}» за {self.timeout} с'
+            )
+        observe(
+            'foodgram_db_pool_wait_seconds', time.monotonic() - started,
+            alias=self.alias
+        )
+
+        try:
+            connection = self.take_idle()
+            if connection is None:
+                connection = connect()
+                with self.lock:
+                    self.created[id(connection)] = time.monotonic()
+                self.event('created')
+        except BaseException:
+            self.slots.release()
+            raise
+        self.report()
+        return connection
+
+    def reset_session(self, connection):
+        # Следующий запрос не должен получить SET, временные таблицы и
+        # advisory-блокировки предыдущего. DISCARD ALL нельзя выполнить
+        # внутри транзакции.
+        autocommit = connection.autocommit
+        connection.autocommit = True
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('DISCARD ALL')
+            finally:
+                cursor.close()
+        finally:
+            connection.autocommit = autocommit
+
+    def release(self, connection, discard=False):
+        if self.pid != os.getpid():
+            return
+        try:
+            if not discard:
+                connection.rollback()
+                self.reset_session(connection)
+        except Exception:
+            discard = True
+
+        if (
+            discard
+            or id(connection) not in self.created
+            or self.is_expired(connection)
+        ):
+            self.discard(connection)
+        else:
+            with self.lock:
+                self.idle.append((connection, time.monotonic()))
+        self.slots.release()
+        self.report()
+
+    def close_idle(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+        self.report()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    options = dict(POOL_DEFAULTS, **settings_dict.get('POOL', {}))
+    if options['SIZE'] <= 0:
+        return None
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                alias,
+                size=options['SIZE'],
+                timeout=options['TIMEOUT'],
+                max_age=options['MAX_AGE'],
+                check_interval=options['CHECK_INTERVAL'],
+            )
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire(
+            lambda: super(
+                PooledDatabaseWrapperMixin, self
+            ).get_new_connection(conn_params)
+        )
+
+    def _close(self):
+        pool = self.pool
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection, discard=self.in_atomic_block)
@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_local = threading.local()
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def get_sticky_key(self, request):
+        # Клиенты API с токеном не хранят куки, поэтому после записи
+        # основная база закрепляется за токеном (или сессией) на сервере.
+        credentials = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        if not credentials:
+            return None
+        return 'db-primary:' + sha256(credentials.encode()).hexdigest()
+
+    def is_sticky(self, request):
+        key = self.get_sticky_key(request)
+        if key is not None and caches[settings.DB_REPLICA_STICKY_CACHE].get(
+            key
+        ):
+            return True
+        try:
+            until = float(
+                request.COOKIES.get(settings.DB_REPLICA_STICKY_COOKIE, 0)
+            )
+        except ValueError:
+            return False
+        return until > time.time()
+
+    def stick(self, request, response):
+        key = self.get_sticky_key(request)
+        if key is not None:
+            caches[settings.DB_REPLICA_STICKY_CACHE].set(
+                key, True, settings.DB_REPLICA_STICKY_SECONDS
+            )
+        response.set_cookie(
+            settings.DB_REPLICA_STICKY_COOKIE,
+            str(time.time() + settings.DB_REPLICA_STICKY_SECONDS),
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+
+    def __call__(self, request):
+        replicas = get_replicas()
+        if (
+            replicas
+            and request.method in SAFE_METHODS
+            and not self.is_sticky(request)
+        ):
+            _local.replica = random.choice(replicas)
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.replica = None
+
+        if request.method not in SAFE_METHODS and replicas:
+            self.stick(request, response)
+        return response
@@ -0,0 +1,277 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304
+)
+
+METRICS = {}
+
+HOSTNAME = socket.gethostname()
+ARCHIVE_NAME = 'archive.json'
+
+
+class Metric:
+    def __init__(self, name, kind, help_text, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.buckets = buckets
+
+
+def define(name, kind, help_text, buckets=None):
+    METRICS[name] = Metric(name, kind, help_text, buckets)
+
+
+class Registry:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.flushed_at = 0
+        self.pid = None
+
+    def observe(self, name, value, labels):
+        buckets = METRICS[name].buckets
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {
+                    'buckets': [0] * len(buckets), 'sum': 0, 'count': 0
+                }
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def inc(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = value
+
+    def snapshot(self, with_gauges=True):
+        with self.lock:
+            return [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self.values.items()
+                if with_gauges or METRICS[name].kind != 'gauge'
+            ]
+
+    def flush(self, with_gauges=True):
+        pid = os.getpid()
+        path = get_path(pid)
+        if self.pid != pid:
+            # Файл с этим pid мог остаться от завершённого процесса.
+            archive([path])
+            self.pid = pid
+        write_entries(path, self.snapshot(with_gauges))
+        self.flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if (
+            time.monotonic() - self.flushed_at
+            >= settings.METRICS_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+
+registry = Registry()
+# Дочерний процесс не должен повторно отдавать значения родителя.
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, labels)
+
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, labels)
+
+
+def set_gauge(name, value, **labels):
+    registry.set(name, value, labels)
+
+
+def get_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{HOSTNAME}-{pid}.json')
+
+
+def read_entries(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+
+def write_entries(path, entries):
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(entries, file)
+    os.replace(temporary, path)
+
+
+def merge_entries(merged, entries, with_gauges=True):
+    for entry in entries:
+        metric = METRICS.get(entry['name'])
+        if metric is None or (not with_gauges and metric.kind == 'gauge'):
+            continue
+        key = (entry['name'], tuple(sorted(entry['labels'].items())))
+        value = entry['value']
+        current = merged.get(key)
+        if current is None:
+            merged[key] = value
+        elif isinstance(value, dict):
+            current['buckets'] = [
+                total + count
+                for total, count in zip(current['buckets'], value['buckets'])
+            ]
+            current['sum'] += value['sum']
+            current['count'] += value['count']
+        else:
+            merged[key] = current + value
+    return merged
+
+
+@contextmanager
+def archive_lock():
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, 'archive.lock'), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def archive(paths):
+    # Счётчики завершённых процессов складываются в один файл, их gauge
+    # больше ничего не значат и выбрасываются.
+    with archive_lock():
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return
+        archive_path = os.path.join(settings.METRICS_DIR, ARCHIVE_NAME)
+        merged = merge_entries({}, read_entries(archive_path))
+        for path in paths:
+            merge_entries(merged, read_entries(path), with_gauges=False)
+        write_entries(archive_path, [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in merged.items()
+        ])
+        for path in paths:
+            os.remove(path)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_dead_paths():
+    # Живость проверяется только для процессов этого хоста.
+    prefix = f'{HOSTNAME}-'
+    dead = []
+    for path in glob.glob(
+        os.path.join(settings.METRICS_DIR, f'{glob.escape(prefix)}*.json')
+    ):
+        pid = os.path.basename(path)[len(prefix):-len('.json')]
+        if (
+            pid.isdigit() and int(pid) != os.getpid()
+            and not is_alive(int(pid))
+        ):
+            dead.append(path)
+    return dead
+
+
+@atexit.register
+def flush_on_exit():
+    if settings.configured and settings.METRICS_ENABLED and registry.values:
+        registry.flush(with_gauges=False)
+        archive([get_path(os.getpid())])
+
+
+def collect():
+    dead = get_dead_paths()
+    if dead:
+        archive(dead)
+    merged = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        merge_entries(merged, read_entries(path))
+    return merged
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ).replace('\n', '\\n'))
+        for name, value in items
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render():
+    merged = collect()
+    lines = []
+    for metric in METRICS.values():
+        series = sorted(
+            (labels, value) for (name, labels), value in merged.items()
+            if name == metric.name
+        )
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels, value in series:
+            if metric.kind != 'histogram':
+                lines.append(f'{metric.name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{metric.name}_bucket'
+                    f'{format_labels(labels, le=bound)} {cumulative}'
+                )
+            lines.append(
+                f'{metric.name}_bucket'
+                f'{format_labels(labels, le="+Inf")} {value["count"]}'
+            )
+            lines.append(
+                f'{metric.name}_sum{format_labels(labels)} {value["sum"]}'
+            )
+            lines.append(
+                f'{metric.name}_count{format_labels(labels)} {value["count"]}'
+            )
+    return '\n'.join(lines) + '\n'
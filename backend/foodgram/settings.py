@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from django.core.management.utils import get_random_secret_key
 
@@ -28,11 +29,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
 
-    'recipes',
-    'api'
+    'recipes.apps.RecipesConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'foodgram.db.router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,15 +78,58 @@ if DEBUG is True:
 else:
     DATABASES = {
         'default': {
-            'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+            'ENGINE': os.getenv('DB_ENGINE', default='foodgram.db'),
             'NAME': os.getenv('DB_NAME', default='postgres'),
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
+            'POOL': {
+                'SIZE': int(os.getenv('DB_POOL_SIZE', default=10)),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=10)),
+                'MAX_AGE': float(os.getenv('DB_POOL_MAX_AGE', default=600)),
+                'CHECK_INTERVAL': float(
+                    os.getenv('DB_POOL_CHECK_INTERVAL', default=30)
+                ),
+            },
         }
     }
 
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    replica_settings = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica_settings['ENGINE'] == 'django.db.backends.sqlite3':
+        replica_settings['NAME'] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        replica_settings['HOST'] = host
+        replica_settings['PORT'] = port or replica_settings['PORT']
+    DATABASES[f'replica{number}'] = replica_settings
+
+MEMCACHED_LOCATION = os.getenv('MEMCACHED_LOCATION', default='')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if MEMCACHED_LOCATION:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': MEMCACHED_LOCATION.split(','),
+    }
+
+DATABASE_ROUTERS = ['foodgram.db.router.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10)
+)
+DB_REPLICA_STICKY_COOKIE = 'primary_until'
+DB_REPLICA_STICKY_CACHE = os.getenv(
+    'DB_REPLICA_STICKY_CACHE',
+    default='shared' if MEMCACHED_LOCATION else 'default'
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -121,7 +168,7 @@ AUTH_USER_MODEL = 'recipes.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -151,3 +198,66 @@ DJOSER = {
 }
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', default=1)
+)
+
+PAGINATION_MAX_PAGE_SIZE = int(os.getenv('PAGINATION_MAX_PAGE_SIZE', default=100))
+PAGINATION_COUNT_CACHE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_CACHE_THRESHOLD', default=10000)
+)
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=60)
+)
+
+RECIPE_IMPORT_MAX_ITEMS = int(os.getenv('RECIPE_IMPORT_MAX_ITEMS', default=500))
+RECIPE_BATCH_MAX_ITEMS = int(os.getenv('RECIPE_BATCH_MAX_ITEMS', default=200))
+RECIPE_FAST_SERIALIZER = os.getenv('RECIPE_FAST_SERIALIZER', default='1') == '1'
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=5000))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=1000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=100))
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', default='0') == '1'
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', default=5))
+JOBS_RETRY_DELAY = float(os.getenv('JOBS_RETRY_DELAY', default=5))
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', default=600))
+JOBS_HEARTBEAT_INTERVAL = float(
+    os.getenv('JOBS_HEARTBEAT_INTERVAL', default=30)
+)
+JOBS_RETENTION = int(os.getenv('JOBS_RETENTION', default=7 * 24 * 3600))
+SHOPPING_LIST_TTL = int(os.getenv('SHOPPING_LIST_TTL', default=3600))
+STORED_FILE_GRACE_PERIOD = int(
+    os.getenv('STORED_FILE_GRACE_PERIOD', default=3600)
+)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='1') == '1'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=5))
+METRICS_ALLOWED_NETWORKS = [
+    network for network in os.getenv(
+        'METRICS_ALLOWED_NETWORKS', default='127.0.0.1/32'
+    ).split(',') if network
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+TOKEN_AUTH_CACHE_SIZE = int(os.getenv('TOKEN_AUTH_CACHE_SIZE', default=10000))
+TOKEN_AUTH_CACHE_TTL = float(os.getenv('TOKEN_AUTH_CACHE_TTL', default=60))
+TOKEN_AUTH_SHARED_CACHE = os.getenv(
+    'TOKEN_AUTH_SHARED_CACHE', default='shared' if MEMCACHED_LOCATION else ''
+)
+TOKEN_AUTH_REVALIDATE_INTERVAL = float(
+    os.getenv('TOKEN_AUTH_REVALIDATE_INTERVAL', default=2)
+)
+TOKEN_AUTH_SHARED_CACHE_TTL = int(
+    os.getenv('TOKEN_AUTH_SHARED_CACHE_TTL', default=300)
+)
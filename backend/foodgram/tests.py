@@ -0,0 +1,195 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from foodgram.db.pool import ConnectionPool
+from foodgram.metrics import (ARCHIVE_NAME, collect, define, get_path,
+                              read_entries, registry, write_entries)
+
+from recipes.models import Recipe, Tag, User
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+define('foodgram_test_total', 'counter', 'Тестовый счётчик')
+define('foodgram_test_gauge', 'gauge', 'Тестовый gauge')
+
+
+def get_dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class MetricsArchiveTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory.name
+        registry.pid = None
+
+    def write_worker(self, pid, total, gauge):
+        write_entries(get_path(pid), [
+            {'name': 'foodgram_test_total', 'labels': {}, 'value': total},
+            {'name': 'foodgram_test_gauge', 'labels': {}, 'value': gauge},
+        ])
+
+    def test_dead_worker_is_archived(self):
+        dead_pid = get_dead_pid()
+        self.write_worker(dead_pid, 3, 10)
+        self.write_worker(os.getppid(), 2, 5)
+
+        merged = collect()
+        self.assertEqual(merged[('foodgram_test_total', ())], 5)
+        # Gauge завершённого процесса не учитывается.
+        self.assertEqual(merged[('foodgram_test_gauge', ())], 5)
+        self.assertFalse(os.path.exists(get_path(dead_pid)))
+        self.assertEqual(
+            read_entries(os.path.join(self.directory, ARCHIVE_NAME)),
+            [{'name': 'foodgram_test_total', 'labels': {}, 'value': 3}]
+        )
+
+        self.write_worker(get_dead_pid(), 4, 1)
+        self.assertEqual(collect()[('foodgram_test_total', ())], 9)
+
+    def test_reused_pid_keeps_counters(self):
+        # Файл от прежнего процесса с тем же pid, что у текущего.
+        self.write_worker(os.getpid(), 7, 1)
+        registry.flush()
+        self.assertEqual(collect()[('foodgram_test_total', ())], 7)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.server, self.client = socket.socketpair()
+        self.closed = 0
+        self.autocommit = True
+        self.transaction_status = 0
+        self.statements = []
+
+    def fileno(self):
+        return self.client.fileno()
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        self.statements.append('ROLLBACK')
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+        self.server.close()
+        self.client.close()
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        self.connection.statements.append(
+            (sql, self.connection.autocommit)
+        )
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(
+            'test', size=2, timeout=1, max_age=600, check_interval=30
+        )
+
+    def connect(self):
+        connection = FakeConnection()
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_session_reset_on_release(self):
+        connection = self.pool.acquire(self.connect)
+        connection.autocommit = False
+        self.pool.release(connection)
+        self.assertEqual(
+            connection.statements, ['ROLLBACK', ('DISCARD ALL', True)]
+        )
+        self.assertFalse(connection.autocommit)
+        self.assertIs(self.pool.acquire(self.connect), connection)
+
+    def test_server_closed_connection(self):
+        connection = self.pool.acquire(self.connect)
+        self.pool.release(connection)
+        # Перезапуск сервера: FATAL и закрытие сокета.
+        connection.server.sendall(b'E')
+        connection.server.close()
+        self.assertIsNot(self.pool.acquire(self.connect), connection)
+        self.assertTrue(connection.closed)
+
+    def test_open_transaction(self):
+        connection = self.pool.acquire(self.connect)
+        self.pool.release(connection)
+        connection.transaction_status = 2
+        self.assertIsNot(self.pool.acquire(self.connect), connection)
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    def setUp(self):
+        # Вторая база SQLite без зеркалирования: чтение с неё видно по
+        # тегу, которого нет в основной. Внутри транзакции роутер читает
+        # с основной базы, поэтому тест без обёртки TestCase.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'replica.sqlite3'),
+        }
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(connections['replica'].close)
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Tag)
+        Tag.objects.using('replica').create(
+            name='Реплика', slug='replica', color='#000000'
+        )
+        Tag.objects.create(name='Основная', slug='primary', color='#FFFFFF')
+
+        author = User.objects.create_user(
+            email='author@example.com', username='author', password='pass'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=1,
+            image='recipes/image.png'
+        )
+        self.token = Token.objects.create(user=author)
+
+    def get_tags(self, client):
+        response = client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        return [tag['slug'] for tag in response.data]
+
+    @override_settings(DB_REPLICA_STICKY_SECONDS=60)
+    def test_read_your_writes_without_cookies(self):
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        anonymous = APIClient()
+        self.assertEqual(self.get_tags(anonymous), ['replica'])
+
+        response = writer.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        # Клиент не хранит куки.
+        writer.cookies.clear()
+        self.assertEqual(self.get_tags(writer), ['primary'])
+        self.assertEqual(self.get_tags(anonymous), ['replica'])
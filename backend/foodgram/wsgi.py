@@ -5,3 +5,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+from api.ingredient_index import ingredient_index  # noqa: E402, I100
+
+ingredient_index.refresh()
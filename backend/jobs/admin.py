@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'run_at',
+        'finished',
+    )
+    list_filter = ('status', 'name')
+    raw_id_fields = ('user',)
+    show_full_result_count = False
+    readonly_fields = ('created', 'started', 'finished', 'worker')
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import work
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', default=1, type=int)
+        parser.add_argument('--poll-interval', default=1.0, type=float)
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Завершиться, когда очередь опустеет'
+        )
+
+    def run_process(self, number, options):
+        stopping = []
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stopping.append(True))
+
+        processed = work(
+            f'{socket.gethostname()}:{os.getpid()}',
+            options['poll_interval'],
+            burst=options['burst'],
+            should_stop=lambda: bool(stopping),
+        )
+        connections.close_all()
+        self.stdout.write(f'Обработчик {number}: задач {processed}')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.run_process(1, options)
+            return
+
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=self.run_process, args=(number, options)
+            )
+            for number in range(1, options['processes'] + 1)
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['finished'], name='job_finished_idx'),
+        ),
+    ]
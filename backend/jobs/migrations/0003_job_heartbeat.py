@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_started(apps, schema_editor):
+    # Выполняемые задачи без сигнала иначе никогда не вернутся в очередь.
+    Job = apps.get_model('jobs', 'Job')
+    Job.objects.filter(status='running').update(heartbeat=F('started'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_finished_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал обработчика'),
+        ),
+        migrations.RunPython(copy_started, migrations.RunPython.noop),
+    ]
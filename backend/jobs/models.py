@@ -0,0 +1,70 @@
+import json
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы', default='{}')
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=QUEUED
+    )
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    result = models.TextField('Результат', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    worker = models.CharField('Обработчик', max_length=200, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Пользователь'
+    )
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Запущена', null=True, blank=True)
+    heartbeat = models.DateTimeField(
+        'Последний сигнал обработчика', null=True, blank=True
+    )
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at', 'id'],
+                name='job_claim_idx'
+            ),
+            models.Index(fields=['finished'], name='job_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    @property
+    def arguments(self):
+        payload = json.loads(self.payload)
+        return payload.get('args', []), payload.get('kwargs', {})
+
+    @property
+    def result_data(self):
+        return json.loads(self.result) if self.result else None
@@ -0,0 +1,31 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+
+def enqueue(name, *args, priority=0, user=None, delay=0, max_attempts=None,
+            **kwargs):
+    job = Job.objects.create(
+        name=name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        priority=priority,
+        user=user,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(job.pk))
+    return job
+
+
+def run_eagerly(pk):
+    from .worker import claim, run_claimed
+
+    job = claim('eager', pk)
+    if job is not None:
+        run_claimed(job)
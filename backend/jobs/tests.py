@@ -0,0 +1,163 @@
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.worker import (claim, fail, purge_finished, requeue_stale,
+                         run_claimed)
+
+
+def add(left, right):
+    return left + right
+
+
+class ClaimTest(TestCase):
+    def test_priority_order(self):
+        now = timezone.now()
+        Job.objects.bulk_create([
+            Job(name='low', priority=0, run_at=now - timedelta(minutes=5)),
+            Job(name='high_late', priority=5, run_at=now),
+            Job(name='high', priority=5, run_at=now - timedelta(minutes=1)),
+            Job(name='future', priority=9, run_at=now + timedelta(hours=1)),
+        ])
+        names = []
+        while True:
+            job = claim('test')
+            if job is None:
+                break
+            names.append(job.name)
+        self.assertEqual(names, ['high', 'high_late', 'low'])
+
+    def test_claimed_once(self):
+        job = Job.objects.create(name='jobs.tests.add')
+        claimed = claim('test', job.pk)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.heartbeat)
+        self.assertIsNone(claim('other', job.pk))
+
+    def test_run_claimed(self):
+        job = Job.objects.create(
+            name='jobs.tests.add', payload='{"args": [2, 3], "kwargs": {}}'
+        )
+        self.assertTrue(run_claimed(claim('test', job.pk)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.DONE, '5'))
+
+    def test_result_of_lost_claim_is_ignored(self):
+        job = Job.objects.create(
+            name='jobs.tests.add', payload='{"args": [2, 3], "kwargs": {}}'
+        )
+        lost = claim('test', job.pk)
+        # Задачу вернули в очередь и взял другой обработчик.
+        Job.objects.filter(pk=job.pk).update(status=Job.QUEUED)
+        claim('other', job.pk)
+        run_claimed(lost)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.RUNNING, 'other'))
+
+
+@skipUnless(
+    connection.features.has_select_for_update_skip_locked,
+    'База не поддерживает SKIP LOCKED'
+)
+class ClaimSkipLockedTest(TransactionTestCase):
+    def test_locked_job_is_skipped(self):
+        first = Job.objects.create(name='first', priority=1)
+        second = Job.objects.create(name='second')
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    list(Job.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(claim('test').pk, second.pk)
+        finally:
+            release.set()
+            thread.join()
+
+
+@override_settings(JOBS_RETRY_DELAY=5)
+class FailTest(TestCase):
+    def fail_job(self, attempts):
+        job = Job.objects.create(
+            name='fail', status=Job.RUNNING, attempts=attempts,
+            max_attempts=3
+        )
+        fail(job, 'ошибка')
+        job.refresh_from_db()
+        return job
+
+    def test_backoff(self):
+        for attempts, delay in ((1, 5), (2, 10)):
+            with self.subTest(attempts=attempts):
+                started = timezone.now()
+                job = self.fail_job(attempts)
+                self.assertEqual(job.status, Job.QUEUED)
+                self.assertEqual(job.error, 'ошибка')
+                self.assertGreaterEqual(
+                    job.run_at, started + timedelta(seconds=delay)
+                )
+                self.assertLess(
+                    job.run_at, timezone.now() + timedelta(seconds=delay)
+                )
+
+    def test_max_attempts(self):
+        job = self.fail_job(3)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished)
+
+
+@override_settings(JOBS_TIMEOUT=600)
+class RequeueStaleTest(TestCase):
+    def test_heartbeat(self):
+        now = timezone.now()
+        old = now - timedelta(hours=1)
+        Job.objects.bulk_create([
+            # Долгая задача живого обработчика.
+            Job(name='alive', status=Job.RUNNING, attempts=1,
+                started=old, heartbeat=now),
+            Job(name='stale', status=Job.RUNNING, attempts=1,
+                started=old, heartbeat=old),
+            Job(name='exhausted', status=Job.RUNNING, attempts=5,
+                max_attempts=5, started=old, heartbeat=old),
+        ])
+        requeue_stale()
+        self.assertEqual(
+            dict(Job.objects.values_list('name', 'status')),
+            {'alive': Job.RUNNING, 'stale': Job.QUEUED,
+             'exhausted': Job.FAILED}
+        )
+
+
+@override_settings(JOBS_RETENTION=3600)
+class PurgeFinishedTest(TestCase):
+    def test_purge_old_finished_jobs(self):
+        now = timezone.now()
+        old = now - timedelta(hours=2)
+        Job.objects.bulk_create([
+            Job(name='done', status=Job.DONE, finished=old),
+            Job(name='failed', status=Job.FAILED, finished=old),
+            Job(name='recent', status=Job.DONE, finished=now),
+            Job(name='queued', status=Job.QUEUED),
+            Job(name='running', status=Job.RUNNING, started=old),
+        ])
+        self.assertEqual(purge_finished(batch_size=1), 2)
+        self.assertEqual(
+            sorted(Job.objects.values_list('name', flat=True)),
+            ['queued', 'recent', 'running']
+        )
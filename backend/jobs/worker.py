@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.db.utils import InterfaceError, OperationalError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def claim(worker, pk=None):
+    with transaction.atomic():
+        queryset = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED, run_at__lte=timezone.now()
+        )
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        job = queryset.order_by('-priority', 'run_at', 'id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            started=now,
+            heartbeat=now,
+            worker=worker,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def retry_delay(attempts):
+    return timedelta(
+        seconds=settings.JOBS_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    )
+
+
+def update_status(job, **changes):
+    # Если задачу уже вернули в очередь и взяли снова, статус не трогаем.
+    claimed = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts
+    )
+    try:
+        claimed.update(**changes)
+    except (InterfaceError, OperationalError):
+        # Соединение могло оборваться, пока выполнялась задача.
+        logger.warning('Повторяем запись статуса задачи %s', job)
+        connections.close_all()
+        claimed.update(**changes)
+
+
+@contextmanager
+def heartbeat(job):
+    # Пока задача выполняется, отдельный поток отмечает, что обработчик жив:
+    # requeue_stale возвращает в очередь только задачи без сигнала.
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+                try:
+                    Job.objects.filter(
+                        pk=job.pk, status=Job.RUNNING, attempts=job.attempts
+                    ).update(heartbeat=timezone.now())
+                except (InterfaceError, OperationalError):
+                    logger.exception('Нет соединения с базой данных')
+                    connections.close_all()
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def fail(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        changes = {'status': Job.FAILED, 'finished': now}
+    else:
+        changes = {
+            'status': Job.QUEUED, 'run_at': now + retry_delay(job.attempts)
+        }
+    update_status(job, error=error, **changes)
+
+
+def run_claimed(job):
+    args, kwargs = job.arguments
+    try:
+        result = import_string(job.name)(*args, **kwargs)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', job)
+        fail(job, traceback.format_exc())
+        return False
+
+    update_status(
+        job,
+        status=Job.DONE,
+        result='' if result is None else json.dumps(result),
+        error='',
+        finished=timezone.now(),
+    )
+    return True
+
+
+def requeue_stale():
+    deadline = timezone.now() - timedelta(seconds=settings.JOBS_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat__lt=deadline)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        error='Обработчик не завершил задачу',
+        finished=timezone.now(),
+    )
+    return stale.update(status=Job.QUEUED, run_at=timezone.now())
+
+
+def purge_finished(batch_size=1000):
+    deadline = timezone.now() - timedelta(seconds=settings.JOBS_RETENTION)
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED), finished__lt=deadline
+    )
+    purged = 0
+    while True:
+        # Пачками, чтобы не держать долгую блокировку на большой таблице.
+        ids = list(finished.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def work(worker, poll_interval, burst=False, should_stop=lambda: False):
+    processed = 0
+    checked_at = 0
+    while not should_stop():
+        try:
+            if time.monotonic() - checked_at >= settings.JOBS_TIMEOUT:
+                requeue_stale()
+                purge_finished()
+                checked_at = time.monotonic()
+            job = claim(worker)
+        except (InterfaceError, OperationalError):
+            logger.exception('Нет соединения с базой данных')
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            with heartbeat(job):
+                run_claimed(job)
+        except (InterfaceError, OperationalError):
+            # Задача останется RUNNING, и requeue_stale вернёт её в очередь.
+            logger.exception('Не удалось сохранить статус задачи %s', job)
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        processed += 1
+        close_old_connections()
+    return processed
@@ -1,49 +1,99 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredients,
                      ShoppingCart, Tag, User)
+from .search import schedule_index
+
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if queryset.query.where or connection.vendor != 'postgresql':
+            return super().count
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < EXACT_COUNT_LIMIT:
+            return super().count
+        return row[0]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
 
 class UserAdmin(UserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display = (
         'id',
         'username',
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = (
-        'email',
-        'first_name'
+        'is_staff',
+        'is_active',
+    )
+    search_fields = (
+        '^email',
+        '^username',
     )
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeIngredientsInline(admin.TabularInline):
+    model = RecipeIngredients
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+    min_num = 1
+
+
+class RecipeAdmin(LargeTableAdmin):
     list_display = (
         'id',
         'name',
         'author',
-        'favorite'
-    )
-
-    readonly_fields = ('favorite',)
-    list_filter = (
-        'name',
-        'author',
-        'tags'
+        'favorites_count',
+        'in_carts_count',
+        'created',
     )
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name',)
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', 'in_carts_count', 'created')
+    inlines = (RecipeIngredientsInline,)
 
-    def favorite(self, obj):
-        return obj.favorites.count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        schedule_index([form.instance.pk])
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = (
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    ordering = ('name', 'measurement_unit')
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -52,13 +102,38 @@ class TagAdmin(admin.ModelAdmin):
         'slug',
         'color'
     )
+    search_fields = ('name', 'slug')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('^user__email', '^author__email')
+
+
+class UserRecipeAdmin(LargeTableAdmin):
+    list_display = (
+        'user',
+        'recipe',
+    )
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('^user__email', 'recipe__name')
+
+
+class RecipeIngredientsAdmin(LargeTableAdmin):
+    list_display = (
+        'recipe',
+        'ingredient',
+        'amount',
+    )
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', '^ingredient__name')
 
 
 admin.site.register(Follow, FollowAdmin)
@@ -66,6 +141,6 @@ admin.site.register(User, UserAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
-admin.site.register(Favorite)
-admin.site.register(RecipeIngredients)
-admin.site.register(ShoppingCart)
+admin.site.register(Favorite, UserRecipeAdmin)
+admin.site.register(RecipeIngredients, RecipeIngredientsAdmin)
+admin.site.register(ShoppingCart, UserRecipeAdmin)
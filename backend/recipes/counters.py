@@ -0,0 +1,31 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Follow, Recipe, ShoppingCart, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, counter, pk, delta):
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter}__gte': -delta})
+    return queryset.update(**{counter: F(counter) + delta})
+
+
+def actual_count(source, relation):
+    return Coalesce(
+        Subquery(
+            source.objects.filter(
+                **{relation: OuterRef('pk')}
+            ).order_by().values(relation).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from jobs.queue import enqueue
+
+from .models import FeedEntry, Follow, Recipe
+
+CLEAR_SQL = 'DELETE FROM recipes_feedentry'
+REBUILD_SQL = (
+    'INSERT INTO recipes_feedentry (user_id, recipe_id, author_id, created) '
+    'SELECT follow.user_id, recipe.id, recipe.author_id, recipe.created '
+    'FROM recipes_follow follow '
+    'JOIN recipes_user author ON author.id = follow.author_id '
+    'JOIN (SELECT id, author_id, created, ROW_NUMBER() OVER ('
+    'PARTITION BY author_id ORDER BY created DESC, id DESC) AS position '
+    'FROM recipes_recipe) recipe ON recipe.author_id = follow.author_id '
+    'WHERE author.followers_count < %s AND recipe.position <= %s'
+)
+
+FEED_PRIORITY = 0
+FEED_ORDERING = ('-feed_created', '-feed_recipe')
+
+
+def push_entries(user_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                created=created,
+            )
+            for user_id in user_ids
+            for recipe_id, author_id, created in recipes
+        ],
+        ignore_conflicts=True
+    )
+
+
+def fan_out(recipe_ids):
+    recipes = Recipe.objects.filter(
+        pk__in=recipe_ids,
+        author__followers_count__lt=settings.FEED_FANOUT_LIMIT
+    ).values_list('id', 'author_id', 'created')
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe[1], []).append(recipe)
+
+    for author_id, author_recipes in by_author.items():
+        last_user_id = 0
+        while True:
+            user_ids = list(Follow.objects.filter(
+                author_id=author_id, user_id__gt=last_user_id
+            ).order_by('user_id').values_list(
+                'user_id', flat=True
+            )[:settings.FEED_BATCH_SIZE])
+            if not user_ids:
+                break
+            push_entries(user_ids, author_recipes)
+            last_user_id = user_ids[-1]
+
+
+def backfill(user_id, author_id):
+    follow = Follow.objects.filter(
+        user_id=user_id,
+        author_id=author_id,
+        author__followers_count__lt=settings.FEED_FANOUT_LIMIT
+    )
+    if not follow.exists():
+        return
+    push_entries([user_id], Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-created', '-id').values_list(
+        'id', 'author_id', 'created'
+    )[:settings.FEED_BACKFILL_SIZE])
+
+
+def schedule_fan_out(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        enqueue('recipes.feed.fan_out', recipe_ids, priority=FEED_PRIORITY)
+
+
+def schedule_backfill(user_id, author_id):
+    enqueue(
+        'recipes.feed.backfill', user_id, author_id, priority=FEED_PRIORITY
+    )
+
+
+def remove_author(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(db_connection=connection):
+    with db_connection.cursor() as cursor:
+        cursor.execute(CLEAR_SQL)
+        cursor.execute(REBUILD_SQL, (
+            settings.FEED_FANOUT_LIMIT, settings.FEED_BACKFILL_SIZE
+        ))
+
+
+def feed_recipes(user):
+    # Ключ ленты (feed_created, feed_recipe) совпадает с (created, id)
+    # рецепта, поэтому курсор не зависит от того, какая ветка ниже выбрана.
+    pulled = list(Follow.objects.filter(
+        user=user,
+        author__followers_count__gte=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    if not pulled:
+        return Recipe.objects.filter(feed_entries__user=user).annotate(
+            feed_created=F('feed_entries__created'),
+            feed_recipe=F('feed_entries__recipe'),
+        ).order_by(*FEED_ORDERING)
+    return Recipe.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe'))
+        | Q(author_id__in=pulled)
+    ).annotate(
+        feed_created=F('created'),
+        feed_recipe=F('id'),
+    ).order_by(*FEED_ORDERING)
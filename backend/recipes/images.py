@@ -0,0 +1,114 @@
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .models import Recipe, StoredFile
+
+IMAGE_PRIORITY = 10
+VARIANTS = {
+    'thumb': 300,
+    'card': 600,
+    'full': 1200,
+}
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True,
+                             'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def variant_name(name, variant, image_format):
+    extension = FORMATS[image_format][1]
+    return f'{os.path.splitext(name)[0]}_{variant}.{extension}'
+
+
+def variant_names(name):
+    return {
+        variant: {
+            image_format: variant_name(name, variant, image_format)
+            for image_format in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def generate_variants(name):
+    missing = {
+        (variant, image_format): target
+        for variant, formats in variant_names(name).items()
+        for image_format, target in formats.items()
+        if not default_storage.exists(target)
+    }
+    if not missing:
+        return name
+
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for image_format, (pil_format, _, options) in FORMATS.items():
+            target = missing.get((variant, image_format))
+            if target is None:
+                continue
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+
+    return name
+
+
+def delete_image(name):
+    for formats in variant_names(name).values():
+        for variant in formats.values():
+            default_storage.delete(variant)
+    default_storage.delete(name)
+
+
+def delete_unreferenced_file(name):
+    grace_period = timedelta(seconds=settings.STORED_FILE_GRACE_PERIOD)
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(
+            name=name, references=0
+        ).first()
+        if stored is None:
+            return
+        wait = stored.used + grace_period - timezone.now()
+        if wait > timedelta(0):
+            schedule_file_cleanup(name, wait.total_seconds())
+            return
+        delete_image(name)
+        stored.delete()
+
+
+def schedule_file_cleanup(name, delay=None):
+    enqueue(
+        'recipes.images.delete_unreferenced_file', name,
+        delay=settings.STORED_FILE_GRACE_PERIOD if delay is None else delay
+    )
+
+
+def generate_recipe_variants(recipe_id, name):
+    generate_variants(name)
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_processed=True
+    )
+
+
+def process_image(recipe_id, name):
+    enqueue(
+        'recipes.images.generate_recipe_variants', recipe_id, name,
+        priority=IMAGE_PRIORITY
+    )
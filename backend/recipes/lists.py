@@ -0,0 +1,66 @@
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from .counters import actual_count
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def execute(model, sql, params):
+    alias = router.db_for_write(model)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def update_counters(model, recipe_ids, changed, delta):
+    counter = COUNTERS[model]
+    recipes = Recipe.objects.filter(pk__in=recipe_ids)
+    if changed == len(recipe_ids):
+        if delta < 0:
+            recipes = recipes.filter(**{f'{counter}__gte': -delta})
+        recipes.update(**{counter: F(counter) + delta})
+    elif changed:
+        recipes.update(**{counter: actual_count(model, 'recipe')})
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return 0
+
+    operations = connections[router.db_for_write(model)].ops
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    added = execute(
+        model,
+        f'{operations.insert_statement(ignore_conflicts=True)} '
+        f'{model._meta.db_table} (user_id, recipe_id) '
+        f'SELECT %s, id FROM {Recipe._meta.db_table} '
+        f'WHERE id IN ({placeholders}) '
+        f'{operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+        [user.pk, *recipe_ids]
+    )
+    update_counters(model, recipe_ids, added, 1)
+    return added
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return 0
+
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    removed = execute(
+        model,
+        f'DELETE FROM {model._meta.db_table} '
+        f'WHERE user_id = %s AND recipe_id IN ({placeholders})',
+        [user.pk, *recipe_ids]
+    )
+    update_counters(model, recipe_ids, removed, -1)
+    return removed
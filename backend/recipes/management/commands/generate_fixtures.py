@@ -0,0 +1,315 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, repeat
+
+from PIL import Image
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.feed import rebuild
+from recipes.images import generate_variants
+from recipes.models import (DataVersion, Favorite, FeedEntry, Follow,
+                            INGREDIENT_CATALOG, Ingredient, MAX_TAGS, Recipe,
+                            RecipeIngredients, ShoppingCart, StoredFile, Tag,
+                            User, tags_mask)
+from recipes.readers import batches
+from recipes.search import get_backend
+
+FIXTURE_PASSWORD = 'fixture-password'
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий',
+    'Наталья', 'Алексей', 'Татьяна', 'Андрей',
+)
+LAST_NAMES = (
+    'Иванова', 'Смирнов', 'Кузнецова', 'Попов', 'Соколова', 'Лебедев',
+    'Козлова', 'Новиков', 'Морозова', 'Волков',
+)
+TAGS = (
+    ('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'), ('Выпечка', 'baking'), ('Суп', 'soup'),
+    ('Салат', 'salad'), ('Закуска', 'snack'), ('Напиток', 'drink'),
+    ('Вегетарианское', 'vegetarian'),
+)
+DISHES = (
+    'Борщ', 'Суп', 'Салат', 'Пирог', 'Омлет', 'Каша', 'Плов', 'Рагу',
+    'Запеканка', 'Котлеты', 'Блины', 'Паста', 'Щи', 'Сырники', 'Жаркое',
+)
+STYLES = (
+    'по-домашнему', 'по-грузински', 'на скорую руку', 'от шефа',
+    'классический', 'с травами', 'с сыром', 'с грибами', 'острый',
+    'летний', 'бабушкин', 'праздничный',
+)
+STEPS = (
+    'Нарежьте овощи.', 'Разогрейте сковороду.', 'Доведите воду до кипения.',
+    'Посолите и поперчите.', 'Перемешайте до однородности.',
+    'Запекайте до золотистой корочки.', 'Дайте настояться.',
+    'Подавайте горячим.', 'Украсьте зеленью.', 'Тушите под крышкой.',
+)
+INGREDIENT_NAMES = (
+    'мука', 'сахар', 'соль', 'яйца', 'молоко', 'масло', 'картофель',
+    'морковь', 'лук', 'чеснок', 'томаты', 'сыр', 'курица', 'говядина',
+    'рис', 'гречка', 'капуста', 'свёкла', 'перец', 'зелень',
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def zipf_weights(size, exponent):
+    return list(accumulate(
+        1 / (rank + 1) ** exponent for rank in range(size)
+    ))
+
+
+class Command(BaseCommand):
+    help = 'Generate large synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=1000, type=int)
+        parser.add_argument('--recipes', default=10000, type=int)
+        parser.add_argument('--tags', default=6, type=int)
+        parser.add_argument('--ingredients', default=2000, type=int)
+        parser.add_argument('--favorites', default=50000, type=int)
+        parser.add_argument('--carts', default=5000, type=int)
+        parser.add_argument('--follows', default=10000, type=int)
+        parser.add_argument(
+            '--skew',
+            default=1.1,
+            type=float,
+            help='Показатель распределения Ципфа для авторов и рецептов'
+        )
+        parser.add_argument('--batch-size', default=5000, type=int)
+        parser.add_argument('--seed', default=0, type=int)
+
+    def handle(self, *args, **options):
+        if options['tags'] > MAX_TAGS:
+            raise CommandError(f'Тегов не может быть больше {MAX_TAGS}')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+
+        tag_bits = self.create_tags(options['tags'])
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(options['users'])
+        if not user_ids:
+            user_ids = list(User.objects.values_list('id', flat=True))
+        if not user_ids:
+            raise CommandError('Нет пользователей для рецептов')
+
+        self.create_recipes(
+            options['recipes'], user_ids, tag_bits, ingredient_ids
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        all_user_ids = list(User.objects.values_list('id', flat=True))
+        if recipe_ids:
+            self.create_pairs(
+                Favorite, options['favorites'], all_user_ids, recipe_ids
+            )
+            self.create_pairs(
+                ShoppingCart, options['carts'], all_user_ids, recipe_ids
+            )
+        self.create_follows(options['follows'], all_user_ids)
+
+        call_command('recount', stdout=self.stdout)
+        with transaction.atomic():
+            rebuild()
+        self.report('Записи ленты', FeedEntry.objects.count())
+
+    def report(self, title, count):
+        self.stdout.write(f'{title}: {count}')
+
+    def create_tags(self, count):
+        existing = Tag.objects.count()
+        names = set(Tag.objects.values_list('name', flat=True))
+        slugs = set(Tag.objects.values_list('slug', flat=True))
+        colors = set(Tag.objects.values_list('color', flat=True))
+        candidates = TAGS + tuple(
+            (f'Тег {number}', f'tag-{number}') for number in range(MAX_TAGS)
+        )
+
+        created = 0
+        for name, slug in candidates:
+            if existing + created >= count:
+                break
+            if name in names or slug in slugs:
+                continue
+            color = f'#{self.rng.randrange(0x1000000):06X}'
+            while color in colors:
+                color = f'#{self.rng.randrange(0x1000000):06X}'
+            colors.add(color)
+            Tag.objects.create(name=name, slug=slug, color=color)
+            created += 1
+
+        self.report('Теги', created)
+        return dict(Tag.objects.values_list('id', 'bit'))
+
+    def create_ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=f'{self.rng.choice(INGREDIENT_NAMES)} {number}',
+                        measurement_unit=self.rng.choice(UNITS)
+                    )
+                    for number in range(missing)
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            DataVersion.objects.bump(INGREDIENT_CATALOG)
+            self.report('Ингредиенты', missing)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        password = make_password(FIXTURE_PASSWORD)
+        offset = User.objects.aggregate(last=Max('id'))['last'] or 0
+
+        for batch in batches(range(offset, offset + count), self.batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f'fixture{number}',
+                    email=f'fixture{number}@example.com',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    password=password,
+                )
+                for number in batch
+            )
+
+        self.report('Пользователи', count)
+        return list(
+            User.objects.filter(id__gt=offset).values_list('id', flat=True)
+        )
+
+    def create_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), '#E26C2D').save(buffer, 'JPEG')
+        field = Recipe._meta.get_field('image')
+        name = field.storage.save(
+            field.generate_filename(None, 'fixture.jpg'),
+            ContentFile(buffer.getvalue())
+        )
+        generate_variants(name)
+        return name
+
+    def build_recipe(self, author_id, image, tag_bits, ingredient_ids):
+        tags = self.rng.sample(
+            list(tag_bits), self.rng.randint(1, min(3, len(tag_bits)))
+        ) if tag_bits else []
+        ingredients = self.rng.sample(
+            ingredient_ids, min(len(ingredient_ids), self.rng.randint(3, 12))
+        )
+        recipe = Recipe(
+            author_id=author_id,
+            name=f'{self.rng.choice(DISHES)} {self.rng.choice(STYLES)}',
+            text=' '.join(self.rng.choices(STEPS, k=self.rng.randint(3, 8))),
+            cooking_time=self.rng.randint(5, 180),
+            image=image,
+            image_processed=True,
+            tags_mask=tags_mask(tag_bits[tag] for tag in tags),
+        )
+        return recipe, tags, ingredients
+
+    def create_recipes(self, count, user_ids, tag_bits, ingredient_ids):
+        if not count:
+            return
+        image = self.create_image()
+        authors = list(user_ids)
+        self.rng.shuffle(authors)
+        weights = zipf_weights(len(authors), self.skew)
+        started = timezone.now() - timedelta(days=365)
+        step = timedelta(days=365) / count
+
+        for batch in batches(range(count), self.batch_size):
+            built = [
+                self.build_recipe(author, image, tag_bits, ingredient_ids)
+                for author in self.rng.choices(
+                    authors, cum_weights=weights, k=len(batch)
+                )
+            ]
+            recipes = [recipe for recipe, _, _ in built]
+
+            with transaction.atomic():
+                offset = Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+                Recipe.objects.bulk_create(recipes)
+                recipe_ids = Recipe.objects.filter(id__gt=offset).order_by(
+                    'id'
+                ).values_list('id', flat=True)
+                # auto_now_add перезаписывает дату при вставке.
+                for number, recipe, recipe_id in zip(
+                    batch, recipes, recipe_ids
+                ):
+                    recipe.pk = recipe_id
+                    recipe.created = started + step * number
+                Recipe.objects.bulk_update(recipes, ['created'])
+
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+                    for recipe, tags, _ in built
+                    for tag in tags
+                )
+                RecipeIngredients.objects.bulk_create(
+                    RecipeIngredients(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient,
+                        amount=self.rng.randint(1, 500),
+                    )
+                    for recipe, _, ingredients in built
+                    for ingredient in ingredients
+                )
+                get_backend().index_range(recipes[0].pk, recipes[-1].pk)
+
+        StoredFile.objects.add_references(repeat(image, count))
+        self.report('Рецепты', count)
+
+    def create_pairs(self, model, count, user_ids, recipe_ids):
+        recipes = list(recipe_ids)
+        self.rng.shuffle(recipes)
+        weights = zipf_weights(len(recipes), self.skew)
+
+        for batch in batches(range(count), self.batch_size):
+            pairs = dict.fromkeys(zip(
+                self.rng.choices(user_ids, k=len(batch)),
+                self.rng.choices(recipes, cum_weights=weights, k=len(batch)),
+            ))
+            model.objects.bulk_create(
+                [
+                    model(user_id=user, recipe_id=recipe)
+                    for user, recipe in pairs
+                ],
+                ignore_conflicts=True
+            )
+
+        self.report(model._meta.verbose_name_plural, model.objects.count())
+
+    def create_follows(self, count, user_ids):
+        if len(user_ids) < 2:
+            return
+        authors = list(user_ids)
+        self.rng.shuffle(authors)
+        weights = zipf_weights(len(authors), self.skew)
+
+        for batch in batches(range(count), self.batch_size):
+            pairs = dict.fromkeys(
+                (user, author) for user, author in zip(
+                    self.rng.choices(user_ids, k=len(batch)),
+                    self.rng.choices(
+                        authors, cum_weights=weights, k=len(batch)
+                    ),
+                )
+                if user != author
+            )
+            Follow.objects.bulk_create(
+                [Follow(user_id=user, author_id=author)
+                 for user, author in pairs],
+                ignore_conflicts=True
+            )
+
+        self.report('Подписки', Follow.objects.count())
@@ -1,18 +1,24 @@
-import json
 import os
+from functools import partial
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
 
-from recipes.models import Ingredient
+from recipes.models import DataVersion, INGREDIENT_CATALOG, Ingredient
+from recipes.readers import batches, read_csv, read_json, read_ndjson
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
-ALREDY_LOADED_ERROR_MESSAGE = 'Ингредиент уже есть в списке'
+CSV_HEADER = ['name', 'measurement_unit']
+READERS = {
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'csv': partial(read_csv, header=CSV_HEADER),
+}
+FORMATS = tuple(READERS)
 
 
 class Command(BaseCommand):
-    help = 'Load ingredients from json'
+    help = 'Load ingredients from json, ndjson or csv'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -21,22 +27,127 @@ class Command(BaseCommand):
             nargs='?',
             type=str
         )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int
+        )
+        parser.add_argument(
+            '--diff',
+            action='store_true',
+            help=(
+                'Сравнить с каталогом: посчитать новые, неизменённые и '
+                'конфликтующие по единицам измерения ингредиенты'
+            )
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только отчёт, без записи в базу (вместе с --diff)'
+        )
+
+    def get_format(self, options):
+        if options['format']:
+            return options['format']
+        extension = os.path.splitext(options['filename'])[1].lstrip('.')
+        if extension not in FORMATS:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format'
+            )
+        return extension
 
     def handle(self, *args, **options):
+        if options['dry_run'] and not options['diff']:
+            raise CommandError('--dry-run работает только вместе с --diff')
+        read = READERS[self.get_format(options)]
+
         try:
             with open(
                 os.path.join(DATA_ROOT, options['filename']),
                 'r', encoding='utf-8'
-            ) as dict:
-                data = json.load(dict)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(
-                            name=ingredient['name'],
-                            measurement_unit=ingredient['measurement_unit']
-                        )
-                    except IntegrityError:
-                        print(ALREDY_LOADED_ERROR_MESSAGE)
+            ) as file:
+                rows = (
+                    (row['name'].strip(), row['measurement_unit'].strip())
+                    for row in read(file)
+                )
+                if options['diff']:
+                    self.load_diff(rows, options)
+                else:
+                    self.load(rows, options)
+            if not options['dry_run']:
+                # bulk_create не шлёт сигналов, индексы автодополнения
+                # в воркерах сбрасываются по общей версии каталога.
+                DataVersion.objects.bump(INGREDIENT_CATALOG)
 
         except FileNotFoundError:
             raise CommandError('Файл отсутствует в директории data')
+
+    def load(self, rows, options):
+        processed = 0
+        total_before = Ingredient.objects.count()
+
+        for batch in batches(rows, options['batch_size']):
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+            processed += len(batch)
+
+        inserted = Ingredient.objects.count() - total_before
+        self.stdout.write(
+            f'Обработано: {processed}, добавлено: {inserted}, '
+            f'уже были в списке: {processed - inserted}'
+        )
+
+    def load_diff(self, rows, options):
+        unchanged = conflicting = 0
+        created = {}
+
+        for batch in batches(rows, options['batch_size']):
+            catalog = {}
+            for name, measurement_unit in Ingredient.objects.filter(
+                name__in={name for name, _ in batch}
+            ).values_list('name', 'measurement_unit'):
+                catalog.setdefault(name, set()).add(measurement_unit)
+
+            new_ingredients = []
+            for name, measurement_unit in batch:
+                created_units = created.setdefault(name, set())
+                catalog_units = catalog.get(name, set()) - created_units
+                if (
+                    measurement_unit in catalog_units
+                    or measurement_unit in created_units
+                ):
+                    unchanged += 1
+                    continue
+                if catalog_units:
+                    conflicting += 1
+                    if options['verbosity'] > 1:
+                        known = ', '.join(sorted(catalog_units))
+                        self.stdout.write(
+                            f'{name}: {measurement_unit} (в каталоге: {known})'
+                        )
+                    continue
+                created_units.add(measurement_unit)
+                new_ingredients.append(
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                )
+
+            if not options['dry_run']:
+                Ingredient.objects.bulk_create(
+                    new_ingredients, ignore_conflicts=True
+                )
+
+        inserted = sum(len(units) for units in created.values())
+        self.stdout.write(
+            f'Добавлено: {inserted}, без изменений: {unchanged}, '
+            f'конфликтов единиц измерения: {conflicting}'
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generate image variants for recipes that have none yet'
+
+    def handle(self, *args, **options):
+        processed = 0
+        recipes = Recipe.objects.filter(image_processed=False).exclude(
+            image=''
+        ).values_list('pk', 'image')
+
+        for pk, name in recipes.iterator():
+            try:
+                generate_variants(name)
+            except OSError as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            Recipe.objects.filter(pk=pk, image=name).update(
+                image_processed=True
+            )
+            processed += 1
+
+        self.stdout.write(f'Обработано изображений: {processed}')
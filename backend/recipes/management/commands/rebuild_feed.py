@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild followed-authors feed timelines'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+
+        self.stdout.write(
+            f'Записей в ленте: {FeedEntry.objects.count()}'
+        )
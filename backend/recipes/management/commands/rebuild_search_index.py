@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search index for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_backend().rebuild(options['batch_size'])
+
+        self.stdout.write(
+            f'Проиндексировано рецептов: {Recipe.objects.count()}'
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from recipes.counters import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=10000,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model, counter, source, relation in COUNTERS:
+            bounds = model.objects.aggregate(start=Min('pk'), end=Max('pk'))
+            if bounds['start'] is None:
+                continue
+
+            repaired = 0
+            for start in range(bounds['start'], bounds['end'] + 1, batch_size):
+                count = actual_count(source, relation)
+                repaired += model.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size
+                ).exclude(**{counter: count}).update(**{counter: count})
+
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: '
+                f'исправлено {repaired}'
+            )
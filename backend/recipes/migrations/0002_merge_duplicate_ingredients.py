@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:50
+
+from django.db import migrations
+from django.db.models import Count, F, Min, Value
+from django.db.models.functions import Least
+
+AMOUNT_MAX = 32767
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+
+    for duplicate in list(duplicates):
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+
+        for extra_id in extra_ids:
+            used_in = RecipeIngredients.objects.filter(
+                ingredient_id=keep_id
+            ).values('recipe_id')
+            collided = RecipeIngredients.objects.filter(
+                ingredient_id=extra_id, recipe_id__in=used_in
+            )
+            # Количество дубля прибавляем к оставшейся строке рецепта.
+            for row in list(collided):
+                RecipeIngredients.objects.filter(
+                    ingredient_id=keep_id, recipe_id=row.recipe_id
+                ).update(amount=Least(
+                    F('amount') + row.amount, Value(AMOUNT_MAX)
+                ))
+            collided.delete()
+            RecipeIngredients.objects.filter(
+                ingredient_id=extra_id
+            ).update(ingredient_id=keep_id)
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
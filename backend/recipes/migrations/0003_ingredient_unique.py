@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Ограничение отдельно от слияния дублей: в PostgreSQL ALTER TABLE
+    # нельзя выполнить в транзакции с отложенными проверками внешних ключей.
+
+    dependencies = [
+        ('recipes', '0002_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='name_measurement_unit_unique'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('Recipe', 'in_carts_count', 'ShoppingCart', 'recipe'),
+    ('User', 'recipes_count', 'Recipe', 'author'),
+    ('User', 'followers_count', 'Follow', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, counter, source_name, relation in COUNTERS:
+        model = apps.get_model('recipes', model_name)
+        source = apps.get_model('recipes', source_name)
+        model.objects.update(**{counter: Coalesce(
+            Subquery(
+                source.objects.filter(
+                    **{relation: OuterRef('pk')}
+                ).order_by().values(relation).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ),
+            0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
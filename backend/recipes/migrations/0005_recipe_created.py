@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:52
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def spread_created(apps, schema_editor):
+    # Существующие рецепты получают разные даты в порядке id, иначе все
+    # строки совпадают по created и ключ (created, id) вырождается в id.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    last_id = Recipe.objects.aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return
+
+    now = django.utils.timezone.now()
+    previous_id = 0
+    while True:
+        ids = list(Recipe.objects.filter(id__gt=previous_id).order_by(
+            'id'
+        ).values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        Recipe.objects.bulk_update([
+            Recipe(id=pk, created=now - timedelta(milliseconds=last_id - pk))
+            for pk in ids
+        ], ['created'])
+        previous_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата публикации'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-created', '-id'], name='recipe_created_id_idx'),
+        ),
+        migrations.RunPython(spread_created, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_processed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Превью готовы'),
+        ),
+    ]
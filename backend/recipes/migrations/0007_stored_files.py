@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:54
+
+from django.db import migrations, models
+from django.db.models import Count
+import recipes.storage
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    StoredFile = apps.get_model('recipes', 'StoredFile')
+    StoredFile.objects.bulk_create(
+        StoredFile(name=row['image'], references=row['total'])
+        for row in Recipe.objects.exclude(image='').values(
+            'image'
+        ).annotate(total=Count('id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_processed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Фото блюда'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# SQL записан здесь целиком, чтобы правки recipes.search не меняли
+# уже применённую миграцию.
+CREATE_SQL = {
+    'postgresql': (
+        'CREATE TABLE recipes_recipe_search ('
+        'recipe_id integer PRIMARY KEY REFERENCES recipes_recipe (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX recipes_recipe_search_document_idx '
+        'ON recipes_recipe_search USING GIN (document)',
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE recipes_recipe_search USING fts5('
+        "name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2')",
+    ),
+}
+SOURCE_SQL = (
+    'FROM recipes_recipe recipe '
+    'LEFT JOIN recipes_recipeingredients item ON item.recipe_id = recipe.id '
+    'LEFT JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = item.ingredient_id '
+    'GROUP BY recipe.id'
+)
+BACKFILL_SQL = {
+    'postgresql': (
+        'INSERT INTO recipes_recipe_search (recipe_id, document) '
+        'SELECT recipe.id, '
+        "setweight(to_tsvector('russian', replace(replace("
+        "recipe.name, 'ё', 'е'), 'Ё', 'Е')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(replace(replace("
+        "string_agg(ingredient.name, ' '), 'ё', 'е'), 'Ё', 'Е'), '')), "
+        "'B') || "
+        "setweight(to_tsvector('russian', replace(replace("
+        "recipe.text, 'ё', 'е'), 'Ё', 'Е')), 'C') "
+        + SOURCE_SQL
+    ),
+    'sqlite': (
+        'INSERT INTO recipes_recipe_search (rowid, name, ingredients, text) '
+        'SELECT recipe.id, '
+        "replace(replace(recipe.name, 'ё', 'е'), 'Ё', 'Е'), "
+        "replace(replace(group_concat(ingredient.name, ' '), 'ё', 'е'), "
+        "'Ё', 'Е'), "
+        "replace(replace(recipe.text, 'ё', 'е'), 'Ё', 'Е') "
+        + SOURCE_SQL
+    ),
+}
+DROP_SQL = 'DROP TABLE IF EXISTS recipes_recipe_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in CREATE_SQL.get(vendor, ()):
+        schema_editor.execute(sql)
+    if vendor in BACKFILL_SQL:
+        schema_editor.execute(BACKFILL_SQL[vendor])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_stored_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
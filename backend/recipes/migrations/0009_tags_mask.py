@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import (ExpressionWrapper, F, OuterRef, Subquery, Sum,
+                              Value)
+from django.db.models.functions import Cast, Coalesce
+
+
+def assign_bits(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    for bit, tag in enumerate(Tag.objects.order_by('id')):
+        tag.bit = bit
+        tag.save(update_fields=['bit'])
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = Recipe.tags.through
+    Recipe.objects.update(tags_mask=Coalesce(Subquery(
+        RecipeTag.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(mask=Sum(ExpressionWrapper(
+            Cast(Value(1), models.BigIntegerField()).bitleftshift(
+                F('tag__bit')
+            ),
+            output_field=models.BigIntegerField()
+        ))).values('mask')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.RunPython(assign_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Заполнение ленты записано здесь целиком, чтобы правки recipes.feed
+# не меняли уже применённую миграцию.
+FILL_SQL = (
+    'INSERT INTO recipes_feedentry (user_id, recipe_id, author_id, created) '
+    'SELECT follow.user_id, recipe.id, recipe.author_id, recipe.created '
+    'FROM recipes_follow follow '
+    'JOIN recipes_user author ON author.id = follow.author_id '
+    'JOIN (SELECT id, author_id, created, ROW_NUMBER() OVER ('
+    'PARTITION BY author_id ORDER BY created DESC, id DESC) AS position '
+    'FROM recipes_recipe) recipe ON recipe.author_id = follow.author_id '
+    'WHERE author.followers_count < %s AND recipe.position <= %s'
+)
+
+
+def fill_feed(apps, schema_editor):
+    schema_editor.execute(FILL_SQL, (
+        settings.FEED_FANOUT_LIMIT, settings.FEED_BACKFILL_SIZE
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_tags_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.Recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created', '-recipe'], name='feed_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='user_recipe_feed_unique'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
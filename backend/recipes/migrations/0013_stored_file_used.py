@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='used',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последнее использование'),
+        ),
+    ]
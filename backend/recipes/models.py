@@ -1,7 +1,16 @@
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (BigIntegerField, BooleanField, Exists,
+                              ExpressionWrapper, F, OuterRef, Prefetch,
+                              Subquery, Sum, UniqueConstraint, Value, Window)
+from django.db.models.functions import Cast, Coalesce, RowNumber
+from django.utils import timezone
+
+from .storage import content_addressed_storage
 
 ORANGE = '#E26C2D'
 GREEN = '#49B64E'
@@ -14,6 +23,14 @@ COLORS = (
     (PURPLE, 'Пурпурный'),
 )
 
+MAX_TAGS = 63
+
+INGREDIENT_CATALOG = 'ingredients'
+
+
+def tags_mask(bits):
+    return sum(1 << bit for bit in set(bits))
+
 
 class User(AbstractUser):
     email = models.EmailField(
@@ -34,6 +51,16 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -51,6 +78,11 @@ class Tag(models.Model):
     name = models.CharField('Название', max_length=200, unique=True)
     slug = models.SlugField('Slug', max_length=200, unique=True)
     color = models.CharField(choices=COLORS, max_length=16, unique=True)
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -59,6 +91,28 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    def get_free_bit(self):
+        used = set(Tag.objects.exclude(pk=self.pk).values_list(
+            'bit', flat=True
+        ))
+        for bit in range(MAX_TAGS):
+            if bit not in used:
+                return bit
+        raise ValidationError(f'Нельзя создать больше {MAX_TAGS} тегов')
+
+    def clean(self):
+        if self.bit is None:
+            self.get_free_bit()
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.get_free_bit()
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     name = models.CharField('Название', max_length=200)
@@ -67,11 +121,101 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='name_measurement_unit_unique'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_list',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def with_viewer_data(self, user):
+        queryset = self.with_related()
+
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_author_subscribed=Value(
+                    False, output_field=BooleanField()
+                ),
+            )
+
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def with_any_tag(self, tags):
+        mask = tags_mask(tag.bit for tag in tags)
+        return self.annotate(
+            tags_match=F('tags_mask').bitand(mask)
+        ).exclude(tags_match=0)
+
+    def tag_counts(self, tags):
+        counts = self.order_by().aggregate(**{
+            tag.slug: Sum(
+                F('tags_mask').bitand(tag.mask).bitrightshift(tag.bit)
+            )
+            for tag in tags
+        })
+        return {slug: int(count or 0) for slug, count in counts.items()}
+
+    def refresh_tags_mask(self):
+        through = Recipe.tags.through
+        return self.update(tags_mask=Coalesce(Subquery(
+            through.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(mask=Sum(ExpressionWrapper(
+                Cast(Value(1), BigIntegerField()).bitleftshift(
+                    F('tag__bit')
+                ),
+                output_field=BigIntegerField()
+            ))).values('mask')
+        ), 0))
+
+    def latest_for_authors(self, author_ids, limit=None):
+        queryset = self.filter(author_id__in=author_ids).order_by(
+            '-created', '-id'
+        )
+        if not author_ids or limit is None:
+            return queryset
+
+        ranked = queryset.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('created').desc(), F('id').desc()],
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE row_number <= %s ORDER BY created DESC, id DESC',
+            (*params, limit)
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField('Название', max_length=200)
     text = models.TextField('Текст')
@@ -89,13 +233,24 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=content_addressed_storage,
         verbose_name='Фото блюда'
     )
+    image_processed = models.BooleanField(
+        'Превью готовы',
+        default=False,
+        editable=False
+    )
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
         verbose_name='Теги'
     )
+    tags_mask = models.BigIntegerField(
+        'Маска тегов',
+        default=0,
+        editable=False
+    )
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления',
         validators=[
@@ -105,10 +260,45 @@ class Recipe(models.Model):
             )
         ]
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    created = models.DateTimeField(
+        'Дата публикации',
+        auto_now_add=True
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
+        ordering = ('-created', '-id')
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='recipe_author_created_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popularity_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -148,6 +338,7 @@ class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='shopping_cart',
         verbose_name='Пользователь'
     )
@@ -177,6 +368,7 @@ class Favorite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='favorites',
         verbose_name='Пользователь'
     )
@@ -223,3 +415,114 @@ class Follow(models.Model):
                 name='user_author_unique'
             ),
         ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    created = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='user_recipe_feed_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-recipe'],
+                name='feed_user_created_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class StoredFileQuerySet(models.QuerySet):
+    def add_references(self, names):
+        counts = Counter(names)
+        self.bulk_create(
+            [self.model(name=name) for name in counts], ignore_conflicts=True
+        )
+        by_count = {}
+        for name, count in counts.items():
+            by_count.setdefault(count, []).append(name)
+        for count, group in by_count.items():
+            self.filter(name__in=group).update(
+                references=F('references') + count
+            )
+
+    def remove_reference(self, name):
+        # Строка остаётся и при нуле ссылок: файл удаляет отложенная задача,
+        # перепроверив счётчик под блокировкой строки.
+        self.filter(name=name, references__gt=0).update(
+            references=F('references') - 1, used=timezone.now()
+        )
+        return self.filter(name=name, references=0).exists()
+
+    def touch(self, name):
+        return self.filter(name=name).update(used=timezone.now())
+
+
+class StoredFile(models.Model):
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Количество ссылок', default=0)
+    used = models.DateTimeField(
+        'Последнее использование',
+        default=timezone.now
+    )
+
+    objects = StoredFileQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class DataVersionQuerySet(models.QuerySet):
+    def get_version(self, name):
+        return self.filter(name=name).values_list(
+            'version', flat=True
+        ).first() or 0
+
+    def bump(self, name):
+        self.get_or_create(name=name)
+        self.filter(name=name).update(version=F('version') + 1)
+
+
+class DataVersion(models.Model):
+    name = models.CharField('Данные', max_length=50, primary_key=True)
+    version = models.PositiveIntegerField('Версия', default=0)
+
+    objects = DataVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,54 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.management.base import CommandError
+
+CHUNK_SIZE = 64 * 1024
+INVALID_JSON_ERROR_MESSAGE = 'Файл не является JSON-массивом'
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(INVALID_JSON_ERROR_MESSAGE)
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError(INVALID_JSON_ERROR_MESSAGE)
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, header):
+    for number, row in enumerate(csv.reader(file)):
+        if number == 0 and row == header:
+            continue
+        if row:
+            yield dict(zip(header, row))
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
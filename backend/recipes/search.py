@@ -0,0 +1,198 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLE = 'recipes_recipe_search'
+WORD = re.compile(r'\w+')
+
+
+def normalize_sql(expression):
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+NAME_SQL = normalize_sql('recipe.name')
+TEXT_SQL = normalize_sql('recipe.text')
+SOURCE_SQL = (
+    'FROM recipes_recipe recipe '
+    'LEFT JOIN recipes_recipeingredients item ON item.recipe_id = recipe.id '
+    'LEFT JOIN recipes_ingredient ingredient '
+    'ON ingredient.id = item.ingredient_id '
+    '{where} GROUP BY recipe.id'
+)
+
+
+def search_terms(query):
+    return WORD.findall(query.lower().replace('ё', 'е'))
+
+
+class SearchBackend:
+    create_sql = ()
+    drop_sql = ()
+    clear_sql = None
+    delete_sql = None
+    delete_range_sql = None
+    index_sql = None
+
+    def __init__(self, db_connection):
+        self.connection = db_connection
+
+    def execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def create(self):
+        for sql in self.create_sql:
+            self.execute(sql)
+
+    def drop(self):
+        for sql in self.drop_sql:
+            self.execute(sql)
+
+    def index(self, recipe_ids):
+        if self.index_sql is None:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        if self.delete_sql is not None:
+            self.execute(
+                self.delete_sql.format(placeholders=placeholders), recipe_ids
+            )
+        self.execute(
+            self.index_sql.format(
+                where=f'WHERE recipe.id IN ({placeholders})'
+            ),
+            recipe_ids
+        )
+
+    def delete(self, recipe_ids):
+        if self.delete_sql is None:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        self.execute(
+            self.delete_sql.format(placeholders=placeholders), recipe_ids
+        )
+
+    def rebuild(self, batch_size):
+        if self.index_sql is None:
+            return
+        self.execute(self.clear_sql)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT min(id), max(id) FROM recipes_recipe')
+            first, last = cursor.fetchone()
+        if first is None:
+            return
+        for start in range(first, last + 1, batch_size):
+            self.index_range(start, start + batch_size - 1)
+
+    def index_range(self, first, last):
+        if self.index_sql is None:
+            return
+        if self.delete_range_sql is not None:
+            self.execute(self.delete_range_sql, (first, last))
+        self.execute(
+            self.index_sql.format(where='WHERE recipe.id BETWEEN %s AND %s'),
+            (first, last)
+        )
+
+    def filter(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    create_sql = (
+        f'CREATE TABLE {TABLE} ('
+        'recipe_id integer PRIMARY KEY REFERENCES recipes_recipe (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        f'CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document)',
+    )
+    drop_sql = (f'DROP TABLE IF EXISTS {TABLE}',)
+    clear_sql = f'TRUNCATE {TABLE}'
+    ingredients_sql = normalize_sql("string_agg(ingredient.name, ' ')")
+    index_sql = (
+        f'INSERT INTO {TABLE} (recipe_id, document) SELECT recipe.id, '
+        f"setweight(to_tsvector('russian', {NAME_SQL}), 'A') || "
+        "setweight(to_tsvector('russian', "
+        f"coalesce({ingredients_sql}, '')), 'B') || "
+        f"setweight(to_tsvector('russian', {TEXT_SQL}), 'C') "
+        f'{SOURCE_SQL} '
+        'ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document'
+    )
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(where=[
+            f'recipes_recipe.id IN (SELECT recipe_id FROM {TABLE} '
+            "WHERE document @@ to_tsquery('russian', %s))"
+        ], params=[tsquery]).annotate(search_rank=RawSQL(
+            "SELECT ts_rank(document, to_tsquery('russian', %s)) "
+            f'FROM {TABLE} WHERE recipe_id = recipes_recipe.id',
+            (tsquery,)
+        )).order_by('-search_rank', '-id')
+
+
+class SqliteSearchBackend(SearchBackend):
+    create_sql = (
+        f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+        "name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2')",
+    )
+    drop_sql = (f'DROP TABLE IF EXISTS {TABLE}',)
+    clear_sql = f'DELETE FROM {TABLE}'
+    delete_sql = f'DELETE FROM {TABLE} WHERE rowid IN ({{placeholders}})'
+    delete_range_sql = f'DELETE FROM {TABLE} WHERE rowid BETWEEN %s AND %s'
+    ingredients_sql = normalize_sql("group_concat(ingredient.name, ' ')")
+    index_sql = (
+        f'INSERT INTO {TABLE} (rowid, name, ingredients, text) '
+        f'SELECT recipe.id, {NAME_SQL}, {ingredients_sql}, {TEXT_SQL} '
+        f'{SOURCE_SQL}'
+    )
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.extra(where=[
+            f'recipes_recipe.id IN (SELECT rowid FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s)'
+        ], params=[match]).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({TABLE}, 10.0, 5.0, 1.0) FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND rowid = recipes_recipe.id',
+            (match,)
+        )).order_by('-search_rank', '-id')
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_backend(db_connection=connection):
+    return BACKENDS.get(db_connection.vendor, SearchBackend)(db_connection)
+
+
+def index_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        get_backend().index(recipe_ids)
+
+
+def schedule_index(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: index_recipes(recipe_ids))
+
+
+def delete_recipes(recipe_ids):
+    get_backend().delete(list(recipe_ids))
+
+
+def search_recipes(queryset, query):
+    return get_backend().filter(queryset, query)
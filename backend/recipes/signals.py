@@ -0,0 +1,124 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .counters import COUNTERS, change_counter
+from .feed import remove_author, schedule_backfill, schedule_fan_out
+from .images import process_image, schedule_file_cleanup
+from .models import (Follow, Ingredient, Recipe, RecipeIngredients,
+                     StoredFile, Tag)
+from .search import delete_recipes, schedule_index
+
+SEARCH_FIELDS = {'name', 'text'}
+
+
+def connect_counter(model, counter, source, relation):
+    def increment(instance, created, **kwargs):
+        if created:
+            change_counter(
+                model, counter, getattr(instance, f'{relation}_id'), 1
+            )
+
+    def decrement(instance, **kwargs):
+        change_counter(
+            model, counter, getattr(instance, f'{relation}_id'), -1
+        )
+
+    post_save.connect(increment, sender=source, weak=False)
+    post_delete.connect(decrement, sender=source, weak=False)
+
+
+for counter_spec in COUNTERS:
+    connect_counter(*counter_spec)
+
+
+def remove_file_reference(name):
+    if StoredFile.objects.remove_reference(name):
+        schedule_file_cleanup(name)
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(instance, **kwargs):
+    instance._image_uploaded = bool(instance.image) and not (
+        instance.image._committed
+    )
+    instance._replaced_image = None
+    if instance._image_uploaded:
+        instance.image_processed = False
+        if instance.pk is not None:
+            instance._replaced_image = Recipe.objects.filter(
+                pk=instance.pk
+            ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(instance, **kwargs):
+    if not instance._image_uploaded:
+        return
+
+    StoredFile.objects.add_references([instance.image.name])
+    if instance._replaced_image:
+        remove_file_reference(instance._replaced_image)
+    process_image(instance.pk, instance.image.name)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(instance, **kwargs):
+    if instance.image:
+        remove_file_reference(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(instance, update_fields, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        schedule_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_from_search_index(instance, **kwargs):
+    delete_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created=False, **kwargs):
+    if not created:
+        schedule_index(RecipeIngredients.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    else:
+        recipes = Recipe.objects.with_any_tag([instance])
+    recipes.refresh_tags_mask()
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(instance, **kwargs):
+    Recipe.objects.with_any_tag([instance]).refresh_tags_mask()
+
+
+@receiver(post_save, sender=Recipe)
+def push_to_feeds(instance, created, **kwargs):
+    if created:
+        schedule_fan_out([instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        schedule_backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(instance, **kwargs):
+    remove_author(instance.user_id, instance.author_id)
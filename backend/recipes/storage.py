@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+
+        content_hash = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory,
+            content_hash[:2],
+            content_hash[2:4],
+            content_hash + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.hashed_name(name, content)
+        # Сначала отмечаем строку файла: если её сейчас удаляет очистка,
+        # ждём конца её транзакции и затем проверяем, остался ли файл.
+        apps.get_model('recipes', 'StoredFile').objects.touch(name)
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # Тот же файл одновременно записал другой запрос.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое, переименовывать файл нельзя.
+        raise FileExistsError(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from recipes.storage import ContentAddressedStorage
+
+
+class MergeDuplicateIngredientsTest(TransactionTestCase):
+    migrate_from = [('recipes', '0001_initial')]
+    migrate_to = [('recipes', '0002_merge_duplicate_ingredients')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.migrate_from)
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        Recipe = apps.get_model('recipes', 'Recipe')
+        RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+        User = apps.get_model('recipes', 'User')
+
+        author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        salt, *duplicates = [
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+            for _ in range(3)
+        ]
+        self.salt_id = salt.pk
+        both, only_duplicate = [
+            Recipe.objects.create(
+                author=author, name=name, text='Описание', cooking_time=1,
+                image='recipes/image.png'
+            )
+            for name in ('Оба', 'Дубль')
+        ]
+        self.both_id, self.only_duplicate_id = both.pk, only_duplicate.pk
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(recipe=both, ingredient=salt, amount=5),
+            RecipeIngredients(
+                recipe=both, ingredient=duplicates[0], amount=10
+            ),
+            RecipeIngredients(
+                recipe=both, ingredient=duplicates[1], amount=32760
+            ),
+            RecipeIngredients(
+                recipe=only_duplicate, ingredient=duplicates[1], amount=7
+            ),
+        ])
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_amounts_are_summed(self):
+        apps = self.migrate(self.migrate_to)
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+
+        self.assertEqual(
+            list(Ingredient.objects.values_list('id', flat=True)),
+            [self.salt_id]
+        )
+        self.assertEqual(
+            dict(RecipeIngredients.objects.values_list(
+                'recipe_id', 'amount'
+            )),
+            # 5 + 10 + 32760 упирается в предел PositiveSmallIntegerField.
+            {self.both_id: 32767, self.only_duplicate_id: 7}
+        )
+
+
+class ContentAddressedStorageTest(TestCase):
+    def test_concurrent_first_upload(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = ContentAddressedStorage(location=directory.name)
+        name = storage.save('recipes/image.png', ContentFile(b'image'))
+        # Второй запрос проверил exists() до того, как первый записал файл.
+        answers = [False]
+        exists = storage.exists
+        with mock.patch.object(
+            storage, 'exists',
+            lambda name: answers.pop() if answers else exists(name)
+        ):
+            self.assertEqual(
+                storage.save('recipes/other.png', ContentFile(b'image')),
+                name
+            )
+        self.assertEqual(
+            os.listdir(os.path.dirname(storage.path(name))),
+            [os.path.basename(name)]
+        )